@@ -0,0 +1,77 @@
+"""1件ずつの計算と一括評価 (batch.evaluate_batch) の比較
+
+    python benchmarks/bench_batch.py [要素数]
+
+同じ式を要素数ぶんの入力で計算する。
+  1件ずつ: expression.evaluate を要素ごとに呼ぶ (電卓の計算と同じ経路)
+  列ごと:   NumPy なしの evaluate_batch (array('d'))
+  NumPy:    NumPy ありの evaluate_batch
+エラーになる要素 (0 で割る・負の数の √ など) が3つとも一致することも確かめる。
+"""
+import math
+import os
+import random
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import batch
+from expression import CalcError, compile_expression
+
+FORMULAS = (
+    "x * 1.8 + 32",
+    "√x + log(x, 10)",
+    "sin(x) ** 2 + cos(x) ** 2",
+    "1 / (x - 3)",
+    "(x + y) ** 0.5 / y",
+)
+
+def scalar(formula, env):
+    """1件ずつ計算して (値のリスト, エラーのリスト)"""
+    compiled = compile_expression(formula)
+    names = list(env)
+    values, errors = [], []
+    for xs in zip(*env.values()):
+        try:
+            values.append(compiled.evaluate(dict(zip(names, xs))))
+            errors.append(False)
+        except CalcError:
+            values.append(math.nan)
+            errors.append(True)
+    return values, errors
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rnd = random.Random(0)
+    # 負の数・0・整数も混ぜて、エラーになる要素を作る
+    env = {
+        "x": array("d", (rnd.choice((rnd.uniform(-50, 50), float(rnd.randint(-5, 5)))) for _ in range(n))),
+        "y": array("d", (rnd.uniform(-10, 10) for _ in range(n))),
+    }
+    print(f"要素数 {n:,} / NumPy: {'あり ' + batch.np.__version__ if batch.np else 'なし'}")
+    print(f"{'式':<28} {'1件ずつ':>10} {'列ごと':>10} {'NumPy':>10} {'速度比':>8} {'エラー':>8}")
+    for formula in FORMULAS:
+        used = {k: v for k, v in env.items() if k in compile_expression(formula).variables}
+        (values, errors), scalar_ms = timed(lambda: scalar(formula, used))
+        columns, column_ms = timed(lambda: batch.evaluate_batch(formula, use_numpy=False, **used))
+        assert columns.mask == errors, formula
+        line = f"{formula:<28} {scalar_ms:>8.1f}ms {column_ms:>8.1f}ms"
+        if batch.np is not None:
+            vector, numpy_ms = timed(lambda: batch.evaluate_batch(formula, **used))
+            assert vector.mask.tolist() == errors, formula
+            ok = [not e for e in errors]
+            assert batch.np.allclose(vector.values[ok], batch.np.array(values)[ok], equal_nan=True), formula
+            line += f" {numpy_ms:>8.1f}ms {scalar_ms / numpy_ms:>7.0f}x"
+        else:
+            line += f" {'-':>10} {scalar_ms / column_ms:>7.1f}x"
+        print(line + f" {sum(errors):>8,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""キー入力の再生ベンチマーク (キーごとの更新 と keyqueue.KeyQueue の比較)
+
+    python benchmarks/bench_keys.py [往復ms] [キー数]
+
+Flet と同じく、イベントループがキー1つごとにハンドラーを呼ぶ。
+画面の更新1回はクライアントとの往復 (往復ms の sleep) として数える。
+  キーごと:    同期のハンドラー (スレッドプール) が print して毎回更新する (以前の button_clicked)
+  キュー:      async のハンドラーが KeyQueue に積み、描画中に届いたキーをまとめて1回で更新する
+台本どおりに一気に送るとき (keys/sec) と、人が連打する間隔で送るとき (表示までの遅れ) を測る。
+キーが欠けたり重複したりしていないこと、実際に処理した順に計算し直した表示と一致することも確かめ、
+送った順と処理した順が食い違ったキーの数を表示する (スレッドプールでは入れ替わることがある)。
+"""
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from engine import CalculatorEngine
+from keyqueue import KeyQueue
+
+# 数字の連打と演算子を混ぜたキー列
+BURST = "1 2 3 4 5 6 + 7 8 9 0 1 * 2 = 4 5 6 7 - 8 9 1 2 3 4 5 ="
+# 連打の間隔 (秒)
+MASH_INTERVAL = 0.015
+
+class Calc:
+    """画面と同じエンジンに、更新の回数と表示までの遅れを数える render を付けたもの"""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.engine = CalculatorEngine()
+        self.shown = "0"
+        self.updates = 0
+        self.order = []
+        # キーが届いた時刻 -> 表示されるまでの遅れ
+        self.waiting = []
+        self.delays = []
+
+    def press(self, item):
+        key, arrived = item
+        self.order.append(key)
+        self.waiting.append(arrived)
+        self.engine.press(key)
+
+    def display(self):
+        return self.engine.display()
+
+    def render(self):
+        shown = self.display()
+        waiting, self.waiting = self.waiting, []
+        if shown != self.shown:
+            # クライアントとの往復
+            time.sleep(self.rtt)
+            self.shown = shown
+            self.updates += 1
+        done = time.perf_counter()
+        self.delays.extend(done - t for t in waiting)
+
+def per_key(calc):
+    lock = threading.Lock()
+
+    def handler(item):
+        print(f"Button clicked with data = {item[0]}")
+        with lock:
+            calc.press(item)
+            calc.render()
+
+    # Flet は同期のハンドラーをスレッドプールで実行する
+    return lambda item: asyncio.get_running_loop().run_in_executor(None, handler, item)
+
+def queued(calc):
+    keys = KeyQueue(calc.press, calc.render)
+
+    async def handler(item):
+        keys.append(item)
+        await asyncio.to_thread(keys.drain)
+
+    return lambda item: asyncio.ensure_future(handler(item))
+
+async def dispatch(make_handler, calc, keys, interval):
+    handler = make_handler(calc)
+    pending = []
+    for key in keys:
+        pending.append(handler((key, time.perf_counter())))
+        # 一気に送るときも、イベントは1つずつループに届く
+        await asyncio.sleep(interval)
+    await asyncio.gather(*pending)
+
+def replay(make_handler, rtt, keys, interval=0.0):
+    """(秒, Calc)"""
+    calc = Calc(rtt)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        asyncio.run(dispatch(make_handler, calc, keys, interval))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(calc.order) == sorted(keys), "キーが欠けた・重複した"
+    check = Calc(0)
+    for key in calc.order:
+        check.press((key, 0))
+    assert check.display() == calc.display()
+    return elapsed, calc
+
+def swapped(keys, order):
+    return sum(a != b for a, b in zip(keys, order))
+
+def main():
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 20) / 1000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    burst = BURST.split()
+    keys = (burst * (count // len(burst) + 1))[:count]
+    print(f"往復 {rtt * 1000:.0f}ms / {len(keys):,} キー")
+
+    for label, make in (("キーごと", per_key), ("キュー", queued)):
+        elapsed, calc = replay(make, rtt, keys)
+        print(f"{label:<8} 一気に: {len(keys) / elapsed:>9,.0f} keys/s  更新 {calc.updates:>5,} 回  "
+              f"順番の入れ替わり {swapped(keys, calc.order):>4} キー")
+
+    mash = keys[:200]
+    for label, make in (("キーごと", per_key), ("キュー", queued)):
+        elapsed, calc = replay(make, rtt, mash, MASH_INTERVAL)
+        print(f"{label:<8} 連打 ({MASH_INTERVAL * 1000:.0f}ms 間隔): 表示までの遅れ p50 "
+              f"{statistics.median(calc.delays) * 1000:7.1f}ms  max {max(calc.delays) * 1000:7.1f}ms  "
+              f"更新 {calc.updates} 回")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""高精度モード (precise.py) の1キーあたりの計算時間
+
+    python benchmarks/bench_precise.py [繰り返し回数]
+
+ボタン操作の列 (7 sin = のような) を、画面と同じエンジン (engine.CalculatorEngine) で
+(表示中の文字列 -> Fraction -> apply_precise -> format_precise) 1キーずつ計算し、
+1キーあたりの時間を通常モード (float) と比べる。式の欄 (evaluate_precise) も測る。
+「初回」は三角関数の表・円周率・式のキャッシュを空にしてから、「2回目」はキャッシュが効いた状態。
+操作の途中で画面が止まって見えないよう、99% のキーが 1ms 未満であることを確かめる
+(最大値は GC や OS のスケジューリングで通常モードでも 1ms を超えることがあるので参考として表示する)。
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import precise
+from engine import CalculatorEngine
+from expression import compile_expression, format_number
+
+BUDGET_MS = 1.0
+
+# よくある操作 (スペース区切りのキー列)
+KEY_SEQUENCES = (
+    "3 0 sin =",
+    "1 8 0 sin =",
+    "4 5 cos =",
+    "1 0 sin =",
+    "1 / 3 * 3 =",
+    "0 . 1 + 0 . 2 =",
+    "2 √ =",
+    "8 log 2 =",
+    "2 ** 0 . 5 =",
+    "1 2 3 4 5 6 7 8 9 * 9 8 7 6 5 4 3 2 1 =",
+    "5 0 % ",
+    "7 +/- * 3 =",
+)
+
+EXPRESSIONS = (
+    "sin(30) + cos(60)",
+    "(1 + 2) * sin(45) ** 2",
+    "log(1024, 2) + √(9/4)",
+    "1/3 + 1/6",
+    "2 ** 100 / 3",
+    "sin(10) ** 2 + cos(10) ** 2",
+    "pi * 2 ** 2",
+)
+
+def clear_caches():
+    for cached in (precise.sin_degrees, precise.pi, precise.euler, precise.precise_ops,
+                   precise.compile_precise, compile_expression):
+        cached.cache_clear()
+
+def key_times(exact):
+    """各キーを押すのにかかった時間 (ms) のリストと、最後の表示"""
+    times, shown = [], []
+    for sequence in KEY_SEQUENCES:
+        engine = CalculatorEngine(exact)
+        for key in sequence.split():
+            start = time.perf_counter()
+            engine.press(key)
+            engine.display()
+            times.append((time.perf_counter() - start) * 1000)
+        shown.append(engine.display())
+    return times, shown
+
+def expression_times(exact):
+    times = []
+    for text in EXPRESSIONS:
+        start = time.perf_counter()
+        if exact:
+            precise.format_precise(precise.evaluate_precise(text))
+        else:
+            format_number(compile_expression(text).evaluate())
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+def report(label, times):
+    p99 = sorted(times)[int(len(times) * 0.99)]
+    ok = p99 < BUDGET_MS
+    print(f"{'✅' if ok else '⚠️'} {label:<22} p50 {statistics.median(times) * 1000:7.1f}µs  "
+          f"p99 {p99 * 1000:7.1f}µs  max {max(times) * 1000:7.1f}µs  ({len(times)} 回)")
+    return ok
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ok = True
+    for exact in (False, True):
+        mode = "高精度" if exact else "通常"
+        clear_caches()
+        cold, shown = key_times(exact)
+        warm = [t for _ in range(rounds) for t in key_times(exact)[0]]
+        ok &= report(f"{mode} キー (初回)", cold)
+        ok &= report(f"{mode} キー (2回目)", warm)
+        clear_caches()
+        cold = expression_times(exact)
+        warm = [t for _ in range(rounds) for t in expression_times(exact)]
+        ok &= report(f"{mode} 式 (初回)", cold)
+        ok &= report(f"{mode} 式 (2回目)", warm)
+        print(f"   表示: {' / '.join(shown)}")
+    print(f"三角関数の表: {precise.sin_degrees.cache_info()}")
+    print(f"1キー {BUDGET_MS}ms 未満: {'OK' if ok else 'NG'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import math
+from array import array
+from itertools import repeat
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy がなければ array('d') の列ごとに計算する (同じ結果・エラーになる)
+    np = None
+
+from expression import ERROR, SCALAR_OPS, CalcError, compile_expression, format_number, run
+
+# --- 一括評価 ---
+# 同じ式を何千個もの入力に対して計算する (単位換算を列全体にかける など)。
+#   evaluate_batch("x * 1.8 + 32", x=celsius)  -> BatchResult
+# 式のバイトコードは1回だけたどり、演算子ごとに配列全体をまとめて計算する。
+# 0 で割る・負の数の √・0 以下の log などは、その要素だけを mask に立てて "Error" 扱いにする
+# (電卓の1件ずつの計算 = expression.evaluate と同じ要素がエラーになる)。
+
+class BatchResult:
+    """values (float の配列) と mask (True ならその要素は Error)"""
+    __slots__ = ("values", "mask")
+
+    def __init__(self, values, mask):
+        self.values = values
+        self.mask = mask
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def error_count(self):
+        return int(sum(self.mask))
+
+    def results(self):
+        """電卓の表示と同じ値のリスト (整数になるものは int、エラーは "Error")"""
+        return [ERROR if bad else format_number(v) for v, bad in zip(self.values, self.mask)]
+
+    def as_masked_array(self):
+        """numpy.ma.MaskedArray (NumPy があるときだけ)"""
+        if np is None:
+            raise RuntimeError("as_masked_array には NumPy が必要です")
+        return np.ma.MaskedArray(np.asarray(self.values), mask=np.asarray(self.mask, dtype=bool))
+
+# --- NumPy 版の演算子 ---
+# 各関数は配列全体を計算し、電卓ならエラーになる要素を bad[0] に OR する
+def _numpy_ops(bad):
+    def flag(mask):
+        bad[0] = bad[0] | mask
+
+    def div(a, b):
+        flag(b == 0)
+        return a / b
+
+    def power(a, b):
+        out = np.power(a, b)
+        # 負の数の非整数乗 (nan)・0 の負の数乗と桁あふれ (inf)
+        flag(~np.isfinite(out) & np.isfinite(a) & np.isfinite(b))
+        return out
+
+    def sqrt(a):
+        flag(a < 0)
+        return np.sqrt(a)
+
+    def log(a, base=None):
+        if base is None:
+            flag(a <= 0)
+            return np.log(a)
+        flag((a <= 0) | (base <= 0) | (base == 1))
+        return np.log(a) / np.log(base)
+
+    return {
+        "+": np.add,
+        "-": np.subtract,
+        "*": np.multiply,
+        "/": div,
+        "**": power,
+        "neg": np.negative,
+        "%": lambda a: a / 100,
+        "sin": lambda a: np.sin(np.radians(a)),
+        "cos": lambda a: np.cos(np.radians(a)),
+        "log": log,
+        "√": sqrt,
+    }
+
+def _evaluate_numpy(code, env, n):
+    env = {name: np.asarray(values, dtype=float) for name, values in env.items()}
+    bad = [np.zeros(n, dtype=bool)]
+    with np.errstate(all="ignore"):
+        out = run(code, env, _numpy_ops(bad))
+    values = np.array(np.broadcast_to(out, (n,)), dtype=float)
+    return BatchResult(values, np.broadcast_to(bad[0], (n,)).copy())
+
+# --- NumPy がないとき (array('d') の列ごと) ---
+def _column_ops(bad, n):
+    def lift(func):
+        def apply(*args):
+            # 定数 (float) は列の長さだけ繰り返す
+            cols = [a if isinstance(a, array) else repeat(a, n) for a in args]
+            out = array("d", bytes(8 * n))
+            for i, xs in enumerate(zip(*cols)):
+                try:
+                    out[i] = func(*xs)
+                except (CalcError, ArithmeticError, ValueError):
+                    out[i] = math.nan
+                    bad[i] = 1
+            return out
+        return apply
+    return {name: lift(func) for name, func in SCALAR_OPS.items()}
+
+def _evaluate_columns(code, env, n):
+    env = {name: values if isinstance(values, array) and values.typecode == "d" else array("d", values)
+           for name, values in env.items()}
+    bad = bytearray(n)
+    out = run(code, env, _column_ops(bad, n))
+    if not isinstance(out, array):
+        out = array("d", repeat(out, n))
+    return BatchResult(out, [bool(b) for b in bad])
+
+def evaluate_batch(expression, use_numpy=None, **env):
+    """式を配列 (NumPy の配列・array('d')・リスト) の各要素で計算して BatchResult を返す
+
+    変数ごとに同じ長さの配列を渡す。use_numpy=False なら NumPy があっても array('d') で計算する。
+    """
+    compiled = compile_expression(expression) if isinstance(expression, str) else expression
+    missing = [name for name in compiled.variables if name not in env]
+    if missing:
+        raise ValueError(f"変数 {', '.join(missing)} の配列がありません")
+    lengths = {len(values) for values in env.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"配列の長さがそろっていません: {sorted(lengths)}")
+    n = lengths.pop() if lengths else 1
+
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy and np is None:
+        raise RuntimeError("use_numpy=True には NumPy が必要です")
+    return (_evaluate_numpy if use_numpy else _evaluate_columns)(compiled.code, env, n)
@@ -0,0 +1,146 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+try:
+    # 対話モードで矢印キーの履歴・行の編集を使う (Windows などでは無くても動く)
+    import readline
+except ImportError:
+    readline = None
+
+from engine import CalculatorEngine
+from expression import ERROR
+
+# --- コマンドラインの電卓 ---
+# 画面と同じエンジン (engine.py) で、式またはボタン操作を1行ずつ計算して結果を1行ずつ出力する。
+# 入力は先頭から chunk_size 行ずつ読み、大きなファイルはプロセスプールで並列に計算する
+# (結果は入力と同じ順で出力し、先読みはプロセス数の2倍のチャンクまでなので、何百万行でもメモリは一定)。
+#
+# 例: python src/cli.py                          (端末なら対話モード)
+#     python src/cli.py exprs.txt > results.txt  (1行に1つの式)
+#     echo "1 2 + 3 =" | python src/cli.py --keys -
+
+CLI_CHUNK_LINES = 2000
+# --workers を省略したとき、これ以上の大きさのファイルはプロセスプールで計算する
+PARALLEL_MIN_BYTES = 1 << 20
+
+def evaluate_lines(lines, precise=False, keys=False):
+    """行ごとの結果 (画面の表示と同じ文字列) のリスト。空行は空行のまま返す"""
+    engine = CalculatorEngine(precise)
+    results = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            results.append("")
+        elif keys:
+            # ボタン操作は行ごとに AC から始める
+            engine = CalculatorEngine(precise)
+            try:
+                results.append(engine.press_all(line.split()))
+            except ValueError:
+                results.append(ERROR)
+        else:
+            results.append(engine.evaluate_expression(line))
+    return results
+
+def iter_chunks(lines, chunk_size=CLI_CHUNK_LINES):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def evaluate_stream(lines, precise=False, keys=False, workers=1, chunk_size=CLI_CHUNK_LINES):
+    """lines を読みながら結果を1行ずつ返す。workers > 1 ならチャンクごとに別プロセスで計算する"""
+    chunks = iter_chunks(lines, chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from evaluate_lines(chunk, precise, keys)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(evaluate_lines, chunk, precise, keys))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+# --- 対話モード ---
+REPL_HELP = "式を入力して Enter (:keys でボタン操作の入力、:expr で式に戻す、:precise で高精度の切り替え、:q で終了)"
+
+def repl(precise=False, keys=False):
+    # 画面の電卓と同じく、結果は続けて次の計算に使える (ボタン操作は行をまたいで続く)
+    engine = CalculatorEngine(precise)
+    print(f"🧮 {REPL_HELP}")
+    while True:
+        try:
+            line = input("keys> " if keys else "> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            return 0
+        if not line:
+            continue
+        if line in (":q", ":quit"):
+            return 0
+        if line == ":keys":
+            keys = True
+        elif line == ":expr":
+            keys = False
+        elif line == ":precise":
+            engine.set_precise(not engine.precise)
+            print(f"高精度: {'オン' if engine.precise else 'オフ'} ({engine.display()})")
+        elif line.startswith(":"):
+            print(f"❓ {REPL_HELP}")
+        elif keys:
+            try:
+                print(engine.press_all(line.split()))
+            except ValueError as e:
+                print(f"❌ {e}")
+        else:
+            print(engine.evaluate_expression(line))
+
+# --- コマンドライン ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="電卓の式 (またはボタン操作) を1行ずつ計算する")
+    parser.add_argument("input", nargs="?",
+                        help="1行に1つの式を書いたファイル (- なら標準入力。省略して端末から起動したら対話モード)")
+    parser.add_argument("--keys", action="store_true", help="各行をスペース区切りのボタン操作として計算する (例: 1 2 + 3 =)")
+    parser.add_argument("--precise", action="store_true", help="高精度モード (分数で計算し、30°/45° の倍数の sin / cos は正確な値)")
+    parser.add_argument("--workers", type=int,
+                        help=f"プロセス数 (省略時は {PARALLEL_MIN_BYTES >> 20}MiB 以上のファイルなら CPU の数、それ以外は 1)")
+    parser.add_argument("--chunk-size", type=int, default=CLI_CHUNK_LINES)
+    args = parser.parse_args(argv)
+
+    if args.input is None and sys.stdin.isatty():
+        return repl(args.precise, args.keys)
+
+    path = None if args.input in (None, "-") else args.input
+    workers = args.workers
+    if workers is None:
+        workers = (os.cpu_count() or 1) if path and os.path.getsize(path) >= PARALLEL_MIN_BYTES else 1
+
+    start = time.perf_counter()
+    total = errors = 0
+    source = open(path, encoding="utf-8") if path else sys.stdin
+    try:
+        write = sys.stdout.write
+        for result in evaluate_stream(source, args.precise, args.keys, workers, args.chunk_size):
+            write(result + "\n")
+            total += 1
+            errors += result == ERROR
+    finally:
+        if path:
+            source.close()
+    print(f"🧮 計算: {total:,} 行 (エラー {errors:,} 行, {workers} プロセス, "
+          f"{time.perf_counter() - start:.1f}秒)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
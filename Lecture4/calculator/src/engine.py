@@ -0,0 +1,152 @@
+from expression import CalcError, ERROR, ExpressionSyntaxError, apply_operator, compile_expression, format_number
+from precise import apply_precise, evaluate_precise, format_precise, to_fraction
+
+# --- 電卓の状態 (UI なし) ---
+# ボタン操作の状態遷移と計算を Flet のコントロールから切り離したもの。
+# 画面 (main.py の CalculatorApp) もコマンドライン (cli.py) も同じエンジンを使う。
+#   engine = CalculatorEngine()
+#   for key in "1 2 + 3 =".split():
+#       engine.press(key)
+#   engine.display()   # -> "15"
+
+DIGITS = ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", ".")
+OPERATOR_KEYS = ("+", "-", "*", "/", "**", "sin", "cos", "log", "√")
+KEYS = DIGITS + OPERATOR_KEYS + ("AC", "+/-", "%", "=")
+
+class CalculatorEngine:
+    """press(key) で1キー分進め、display() が表示する文字列"""
+    __slots__ = ("value", "entry", "operator", "operand1", "new_operand", "precise", "exact_value")
+
+    def __init__(self, precise=False):
+        # 表示中の値 (計算結果) と、入力途中の数字 (None なら入力中ではない)
+        self.value = "0"
+        self.entry = None
+        # 高精度モード (precise.py): 分数で計算し、sin / cos は 30° / 45° の倍数で正確な値
+        self.precise = precise
+        # 最後に表示した (文字列, Fraction)。表示は丸めてあるので、続けて計算するときは元の値を使う
+        self.exact_value = None
+        self.reset()
+
+    def press(self, data):
+        """キー1つ分の状態の更新。KEYS にないキーは ValueError"""
+        if data in DIGITS and self.value != ERROR:
+            # 入力中の数字はリストにためて、表示するときに1回だけつなげる
+            if self.entry is None or self.entry == ["0"]:
+                if self.entry is None and not (self.value == "0" or self.new_operand):
+                    self.entry = [str(self.value), data]
+                else:
+                    self.entry = [data]
+                self.new_operand = False
+            else:
+                self.entry.append(data)
+            return
+        if data not in KEYS:
+            raise ValueError(f"不明なキーです: {data!r}")
+
+        self.value = self.display()
+        self.entry = None
+        if self.value == ERROR or data == "AC":
+            self.value = "0"
+            self.reset()
+            return
+
+        try:
+            if data in OPERATOR_KEYS:
+                self.value = self.calculate(
+                    self.operand1, self.to_number(self.value), self.operator
+                )
+                self.operator = data
+                if self.value == ERROR:
+                    self.operand1 = "0"
+                else:
+                    self.operand1 = self.to_number(self.value)
+                self.new_operand = True
+
+            elif data == "=":
+                self.value = self.calculate(
+                    self.operand1, self.to_number(self.value), self.operator
+                )
+                self.reset()
+
+            elif data == "%":
+                # 通常モードは以前の画面と同じく整形しない float のまま表示する (50 % -> 0.5, 100 % -> 1.0)
+                if self.precise:
+                    self.value = self.format_number(self.to_number(self.value) / 100)
+                else:
+                    self.value = float(self.value) / 100
+                self.reset()
+
+            elif data == "+/-":
+                if float(self.value) > 0:
+                    self.value = "-" + str(self.value)
+
+                elif float(self.value) < 0:
+                    self.value = str(
+                        self.format_number(abs(self.to_number(self.value)))
+                    )
+        except (CalcError, ValueError):
+            # "." だけのように数として読めない入力
+            self.value = ERROR
+            self.reset()
+
+    def press_all(self, keys):
+        for key in keys:
+            self.press(key)
+        return self.display()
+
+    def display(self):
+        if self.entry is not None:
+            return "".join(self.entry)
+        return str(self.value)
+
+    def evaluate_expression(self, text):
+        """式をまとめて計算して表示する。結果は「=」を押したときと同じく次の計算に使える"""
+        # 同じ式は expression.compile_expression のキャッシュで解析を省く
+        self.entry = None
+        try:
+            if self.precise:
+                value = evaluate_precise(text)
+            else:
+                value = compile_expression(text).evaluate()
+            self.value = self.format_number(value)
+        except (CalcError, ExpressionSyntaxError):
+            self.value = ERROR
+        self.reset()
+        return self.display()
+
+    def set_precise(self, precise):
+        self.value = self.display()
+        self.entry = None
+        self.precise = precise
+        # 表示中の値は新しいモードの表示に直す (途中の計算はそのまま続けられる)
+        if self.value != ERROR:
+            self.value = self.format_number(self.to_number(self.value))
+
+    def to_number(self, value):
+        # 高精度モードでは表示中の文字列を Fraction にする (float を経由すると桁が落ちる)
+        if not self.precise:
+            return float(value)
+        if self.exact_value is not None and self.exact_value[0] == value:
+            return self.exact_value[1]
+        return to_fraction(value)
+
+    def format_number(self, num):
+        if self.precise:
+            text = format_precise(num)
+            self.exact_value = (text, to_fraction(num))
+            return text
+        return format_number(num)
+
+    def calculate(self, operand1, operand2, operator):
+        # 演算子の中身は式の評価と共通 (expression.OPERATORS / 高精度モードは precise.precise_ops)
+        try:
+            if self.precise:
+                return self.format_number(apply_precise(operator, operand1, operand2))
+            return self.format_number(apply_operator(operator, operand1, operand2))
+        except CalcError:
+            return ERROR
+
+    def reset(self):
+        self.operator = "+"
+        self.operand1 = 0
+        self.new_operand = True
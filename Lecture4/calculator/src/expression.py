@@ -0,0 +1,329 @@
+import math
+import re
+from functools import lru_cache
+
+# --- 式の解析と評価 ---
+# 電卓の演算子 (+ - * / ** sin cos log √ と % ) を使った式を字句解析し、
+# Pratt パーサーで構文木 (AST) にしてから、スタックマシン用のバイトコードに変換する。
+#   compile_expression("(1 + 2) * sin(30)")  -> CompiledExpression
+#   evaluate("2 ** 10")                      -> 1024
+# 同じ式は lru_cache で使い回すので、2回目からは解析せずに評価だけ行う。
+# x や rate のような変数も書ける (評価時に値を渡す)。pi と e は定数。
+#
+# 電卓と同じ決まり:
+#   sin / cos は度数法、log(a, b) は b を底とする a の対数 (電卓の「A log B =」)、log(a) は自然対数
+#   0 で割る・負の数の √・0 以下の log は CalcError (画面では "Error")
+
+COMPILE_CACHE_SIZE = 256
+ERROR = "Error"
+
+class CalcError(ArithmeticError):
+    """計算できない (0 で割る・負の数の √ など)"""
+
+class ExpressionSyntaxError(ValueError):
+    """式の書き方が正しくない"""
+
+# --- 演算子 (ノードの種類) ---
+def _div(a, b):
+    if b == 0:
+        raise CalcError("0 で割ることはできません")
+    return a / b
+
+def _pow(a, b):
+    try:
+        value = a ** b
+    except OverflowError:
+        raise CalcError("結果が大きすぎます") from None
+    except ZeroDivisionError:
+        raise CalcError("0 の負の数乗は計算できません") from None
+    if isinstance(value, complex):
+        raise CalcError("負の数の非整数乗は計算できません")
+    return value
+
+def _sqrt(a):
+    if a < 0:
+        raise CalcError("負の数の平方根は計算できません")
+    return math.sqrt(a)
+
+def _log(a, base=None):
+    if a <= 0:
+        raise CalcError("0 以下の対数は計算できません")
+    if base is None:
+        return math.log(a)
+    if base <= 0 or base == 1:
+        raise CalcError("対数の底は 1 以外の正の数にしてください")
+    return math.log(a, base)
+
+def _sin(a):
+    return math.sin(math.radians(a))
+
+def _cos(a):
+    return math.cos(math.radians(a))
+
+# 名前 -> (関数, 引数の数の候補)。バイトコードはこの名前で演算子を指す
+OPERATORS = {
+    "+": (lambda a, b: a + b, (2,)),
+    "-": (lambda a, b: a - b, (2,)),
+    "*": (lambda a, b: a * b, (2,)),
+    "/": (_div, (2,)),
+    "**": (_pow, (2,)),
+    "neg": (lambda a: -a, (1,)),
+    "%": (lambda a: a / 100, (1,)),
+    "sin": (_sin, (1,)),
+    "cos": (_cos, (1,)),
+    "log": (_log, (1, 2)),
+    "√": (_sqrt, (1,)),
+}
+FUNCTIONS = ("sin", "cos", "log", "√")
+CONSTANTS = {"pi": math.pi, "e": math.e}
+SCALAR_OPS = {name: func for name, (func, _) in OPERATORS.items()}
+
+# --- 字句解析 ---
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<op>\*\*|[-+*/%^(),√])
+      | (?P<name>[A-Za-z_]\w*)
+    )""", re.VERBOSE)
+
+def tokenize(text, number=float):
+    """[(種類, 値)] 。種類は 'num' / 'op' / 'name'、最後に ('end', None)
+
+    数値は number(文字列) で変換する (高精度モードでは Fraction)。
+    """
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if not m:
+            raise ExpressionSyntaxError(f"読めない文字があります: {text[pos:].strip()[:10]!r}")
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "num":
+            value = number(value)
+        elif value == "^":
+            value = "**"
+        tokens.append((kind, value))
+        pos = m.end()
+    tokens.append(("end", None))
+    return tokens
+
+# --- 構文木 ---
+class Num:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Num({self.value!r})"
+
+class Var:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Var({self.name!r})"
+
+class Op:
+    """演算子の適用 (二項演算・単項演算・関数呼び出しを区別しない)"""
+    __slots__ = ("name", "args")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __repr__(self):
+        return f"Op({self.name!r}, {self.args!r})"
+
+# --- Pratt パーサー ---
+# 中置演算子の結合力 (大きいほど強い)。** は右結合
+BINARY_POWER = {"+": 10, "-": 10, "*": 20, "/": 20, "**": 40}
+RIGHT_ASSOC = {"**"}
+# 前置 (単項の - と sin / cos / √ / 括弧なしの log) の右側の結合力。** より弱いので -2**2 は -(2**2)
+PREFIX_POWER = 30
+# 後置の % は何よりも強い
+POSTFIX_POWER = 50
+
+class Parser:
+    def __init__(self, text, number=float, constants=CONSTANTS):
+        self.tokens = tokenize(text, number)
+        self.constants = constants
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        kind, got = self.next()
+        if got != value:
+            raise ExpressionSyntaxError(f"{value!r} が必要です" + (f" ({got!r} の前)" if got is not None else ""))
+
+    def parse(self):
+        if self.peek()[0] == "end":
+            raise ExpressionSyntaxError("式が空です")
+        node = self.expression(0)
+        kind, value = self.peek()
+        if kind != "end":
+            raise ExpressionSyntaxError(f"余分な {value!r} があります")
+        return node
+
+    def expression(self, min_power):
+        left = self.prefix()
+        while True:
+            kind, value = self.peek()
+            if kind != "op":
+                if kind in ("num", "name"):
+                    raise ExpressionSyntaxError(f"{value!r} の前に演算子が必要です")
+                return left
+            if value == "%":
+                if POSTFIX_POWER < min_power:
+                    return left
+                self.next()
+                left = Op("%", (left,))
+                continue
+            power = BINARY_POWER.get(value)
+            if power is None or power < min_power or (power == min_power and value not in RIGHT_ASSOC):
+                return left
+            self.next()
+            right = self.expression(power if value in RIGHT_ASSOC else power + 1)
+            left = Op(value, (left, right))
+
+    def prefix(self):
+        kind, value = self.next()
+        if kind == "num":
+            return Num(value)
+        if kind == "op" and value == "(":
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if kind == "op" and value in ("-", "+"):
+            operand = self.expression(PREFIX_POWER)
+            return Op("neg", (operand,)) if value == "-" else operand
+        if value in FUNCTIONS:
+            return self.call(value)
+        if kind == "name":
+            return Num(self.constants[value]) if value in self.constants else Var(value)
+        raise ExpressionSyntaxError("式が途中で終わっています" if kind == "end" else f"{value!r} の位置が正しくありません")
+
+    def call(self, name):
+        """sin(30) / sin 30 / log(8, 2) / √9"""
+        if self.peek() != ("op", "("):
+            return Op(name, (self.expression(PREFIX_POWER),))
+        self.next()
+        args = [self.expression(0)]
+        while self.peek() == ("op", ","):
+            self.next()
+            args.append(self.expression(0))
+        self.expect(")")
+        if len(args) not in OPERATORS[name][1]:
+            raise ExpressionSyntaxError(f"{name} の引数の数が違います ({len(args)} 個)")
+        return Op(name, tuple(args))
+
+def parse(text, number=float, constants=CONSTANTS):
+    """constants にない名前は変数 (Var) になる"""
+    return Parser(text, number, constants).parse()
+
+# --- バイトコード ---
+# 後置記法の命令列。(PUSH, 値) / (LOAD, 変数名) / (CALL, (演算子名, 引数の数))
+PUSH, LOAD, CALL = 0, 1, 2
+
+def _emit(node, code):
+    if isinstance(node, Num):
+        code.append((PUSH, node.value))
+    elif isinstance(node, Var):
+        code.append((LOAD, node.name))
+    else:
+        for arg in node.args:
+            _emit(arg, code)
+        code.append((CALL, (node.name, len(node.args))))
+
+def fold_constants(node):
+    """変数を含まない部分式を先に計算して Num にする (計算できないものはそのまま残す)"""
+    if not isinstance(node, Op):
+        return node
+    args = tuple(fold_constants(a) for a in node.args)
+    if all(isinstance(a, Num) for a in args):
+        try:
+            return Num(SCALAR_OPS[node.name](*(a.value for a in args)))
+        except (CalcError, ArithmeticError, ValueError):
+            # エラーは評価時に出す
+            pass
+    return Op(node.name, args)
+
+def run(code, env=None, ops=SCALAR_OPS):
+    """バイトコードをスタックマシンで実行する。ops を差し替えれば配列でも同じ命令列を使える"""
+    stack = []
+    push = stack.append
+    for kind, arg in code:
+        if kind == PUSH:
+            push(arg)
+        elif kind == LOAD:
+            try:
+                push(env[arg])
+            except (KeyError, TypeError):
+                raise ExpressionSyntaxError(f"変数 {arg} の値がありません") from None
+        else:
+            name, n = arg
+            if n == 1:
+                stack[-1] = ops[name](stack[-1])
+            else:
+                args = stack[-n:]
+                del stack[-n:]
+                push(ops[name](*args))
+    return stack[0]
+
+class CompiledExpression:
+    __slots__ = ("source", "tree", "code", "variables")
+
+    def __init__(self, source, tree):
+        self.source = source
+        self.tree = tree
+        self.code = []
+        _emit(tree, self.code)
+        self.code = tuple(self.code)
+        self.variables = tuple(dict.fromkeys(arg for kind, arg in self.code if kind == LOAD))
+
+    def evaluate(self, env=None):
+        """数値を返す。計算できなければ CalcError"""
+        try:
+            return run(self.code, env)
+        except (OverflowError, ZeroDivisionError, ValueError) as e:
+            if isinstance(e, ExpressionSyntaxError):
+                raise
+            raise CalcError(str(e)) from None
+
+    def __call__(self, **env):
+        return self.evaluate(env)
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(text):
+    """式をバイトコードにする (同じ文字列は解析し直さない)"""
+    return CompiledExpression(text, fold_constants(parse(text)))
+
+def evaluate(text, **env):
+    return compile_expression(text).evaluate(env)
+
+def format_number(num):
+    """整数になる値は int で返す (電卓の表示用)"""
+    if num % 1 == 0:
+        return int(num)
+    return num
+
+def apply_operator(operator, operand1, operand2):
+    """電卓のボタン操作1回分。sin / cos / √ は operand1 だけを使い、log は operand2 を底にする"""
+    func, arities = OPERATORS[operator]
+    try:
+        return func(operand1) if arities == (1,) else func(operand1, operand2)
+    except (OverflowError, ZeroDivisionError, ValueError) as e:
+        raise CalcError(str(e)) from None
@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+
+# --- キー入力のキュー ---
+# Flet の同期ハンドラーはスレッドプールで並行に呼ばれる。キーごとに画面を更新すると
+# 1回ごとにクライアントとの往復が発生し、連打や遅い回線ではその往復がキーの数だけ積み重なる。
+# そこでキーはキューに積み、描画している間に届いたキーは描画中のハンドラーがまとめて処理して、
+# 最後に1回だけ render() を呼ぶ (数字の連打は1回の更新になる)。
+# スレッドプールのハンドラーから積むと押した順と入れ替わることがあるので、
+# async のハンドラーでイベントループ上で append し、描画 (往復) だけをスレッドで行う:
+#   keys = KeyQueue(app.press, app.render)
+#
+#   async def button_clicked(e):
+#       keys.append(e.control.data)
+#       await asyncio.to_thread(keys.drain)
+
+class KeyQueue:
+    """press(key) で状態を更新し、たまったキーを処理し終えたら render() を1回呼ぶ"""
+    __slots__ = ("_keys", "_lock", "_press", "_render", "pressed", "renders")
+
+    def __init__(self, press, render):
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._press = press
+        self._render = render
+        # 処理したキーの数と描画した回数 (ベンチマーク用)
+        self.pressed = 0
+        self.renders = 0
+
+    def append(self, key):
+        self._keys.append(key)
+
+    def put(self, key):
+        """積んでそのまま処理する (同期のハンドラーから)"""
+        self._keys.append(key)
+        self.drain()
+
+    def drain(self):
+        # 他のスレッドが処理中なら、積んだキーはそのスレッドが拾う。
+        # 処理を終えてロックを外す直前に届いたキーは、外側の while で拾い直す
+        while self._keys:
+            if not self._lock.acquire(blocking=False):
+                return
+            try:
+                while self._keys:
+                    self._press(self._keys.popleft())
+                    self.pressed += 1
+                self._render()
+                self.renders += 1
+            finally:
+                self._lock.release()
@@ -1,5 +1,9 @@
+import asyncio
+
 import flet as ft
-import math
+
+from engine import CalculatorEngine
+from keyqueue import KeyQueue
 
 class CalcButton(ft.ElevatedButton):
     def __init__(self, text, button_clicked, expand=1):
@@ -35,16 +39,36 @@ class CalculatorApp(ft.Container):
     # application's root control (i.e. "view") containing all other controls
     def __init__(self):
         super().__init__()
-        self.reset()
+        # ボタン操作の状態と計算 (UI なし・コマンドラインの cli.py と共通)
+        self.engine = CalculatorEngine()
+        self.keys = KeyQueue(self.press, self.render)
 
         self.result = ft.Text(value="0", color=ft.Colors.WHITE, size=20)
+        # 式をまとめて入力して Enter で計算する欄 (括弧・演算子の優先順位あり)
+        self.expression = ft.TextField(
+            hint_text="式を入力 (例: (1+2)*sin(30))",
+            color=ft.Colors.WHITE,
+            text_size=14,
+            dense=True,
+            on_submit=self.expression_submitted,
+        )
+        self.precise_switch = ft.Switch(
+            label="高精度",
+            value=False,
+            label_style=ft.TextStyle(color=ft.Colors.WHITE54, size=12),
+            on_change=self.precise_changed,
+        )
         self.width = 350
         self.bgcolor = ft.Colors.BLACK
         self.border_radius = ft.border_radius.all(20)
         self.padding = 20
         self.content = ft.Column(
             controls=[
-                ft.Row(controls=[self.result], alignment="end"),
+                self.expression,
+                ft.Row(
+                    controls=[self.precise_switch, self.result],
+                    alignment="spaceBetween",
+                ),
                 ft.Row(
                     controls=[
                         ExtraActionButton(
@@ -99,100 +123,38 @@ class CalculatorApp(ft.Container):
             ]
         )
 
-    def button_clicked(self, e):
-        data = e.control.data
-        print(f"Button clicked with data = {data}")
-        if self.result.value == "Error" or data == "AC":
-            self.result.value = "0"
-            self.reset()
-
-        elif data in ("1", "2", "3", "4", "5", "6", "7", "8", "9", "0", "."):
-            if self.result.value == "0" or self.new_operand == True:
-                self.result.value = data
-                self.new_operand = False
-            else:
-                self.result.value = self.result.value + data
-
-        elif data in ("+", "-", "*", "/", "**", "sin", "cos", "log", "√"):
-            self.result.value = self.calculate(
-                self.operand1, float(self.result.value), self.operator
-            )
-            self.operator = data
-            if self.result.value == "Error":
-                self.operand1 = "0"
-            else:
-                self.operand1 = float(self.result.value)
-            self.new_operand = True
-
-        elif data in ("="):
-            self.result.value = self.calculate(
-                self.operand1, float(self.result.value), self.operator
-            )
-            self.reset()
-
-        elif data in ("%"):
-            self.result.value = float(self.result.value) / 100
-            self.reset()
-
-        elif data in ("+/-"):
-            if float(self.result.value) > 0:
-                self.result.value = "-" + str(self.result.value)
-
-            elif float(self.result.value) < 0:
-                self.result.value = str(
-                    self.format_number(abs(float(self.result.value)))
-                )
-
-        self.update()
-
-    def format_number(self, num):
-        if num % 1 == 0:
-            return int(num)
-        else:
-            return num
-
-    def calculate(self, operand1, operand2, operator):
-
-        if operator == "+":
-            return self.format_number(operand1 + operand2)
-
-        elif operator == "-":
-            return self.format_number(operand1 - operand2)
-
-        elif operator == "*":
-            return self.format_number(operand1 * operand2)
-        
-        elif operator == "**":
-            return self.format_number(operand1 ** operand2)
-
-        elif operator == "sin":
-            return self.format_number(math.sin(math.radians(operand1)))
-        
-        elif operator == "cos":
-            return self.format_number(math.cos(math.radians(operand1)))
-        
-        elif operator == "log":
-            if operand1 <= 0:
-                return "Error"
-            else:
-                return self.format_number(math.log(operand1, operand2))
-            
-        elif operator == "√":
-            if operand1 < 0:
-                return "Error"
-            else:
-                return self.format_number(math.sqrt(operand1))
-            
-        elif operator == "/":
-            if operand2 == 0:
-                return "Error"
-            else:
-                return self.format_number(operand1 / operand2)
-
-    def reset(self):
-        self.operator = "+"
-        self.operand1 = 0
-        self.new_operand = True
+    async def button_clicked(self, e):
+        # キーはイベントループ上で押した順にキューへ積み、処理と描画はスレッドで行う。
+        # 描画 (クライアントとの往復) の間に届いたキーはまとめて処理される (keyqueue.py)
+        self.keys.append(e.control.data)
+        await asyncio.to_thread(self.keys.drain)
+
+    async def expression_submitted(self, e):
+        self.keys.append(("expression", self.expression.value))
+        await asyncio.to_thread(self.keys.drain)
+
+    async def precise_changed(self, e):
+        self.keys.append(("precise", self.precise_switch.value))
+        await asyncio.to_thread(self.keys.drain)
+
+    def press(self, data):
+        # 計算はエンジン (engine.py) に任せる。
+        # 式の入力欄と高精度スイッチも (種類, 値) のタプルで同じキューを通す
+        if isinstance(data, tuple):
+            kind, arg = data
+            if kind == "expression":
+                self.engine.evaluate_expression(arg)
+            elif kind == "precise":
+                self.engine.set_precise(arg)
+            return
+        self.engine.press(data)
+
+    def render(self):
+        # 変わったのが表示だけなら、コンテナ全体ではなく結果の Text だけを送る
+        shown = self.engine.display()
+        if self.result.value != shown:
+            self.result.value = shown
+            self.result.update()
 
 
 def main(page: ft.Page):
@@ -204,7 +166,7 @@ def main(page: ft.Page):
     page.add(calc)
     page.add(
         ft.Text(
-            value="このままだとsinやcosは0に近い値を出す場合浮動小数点演算の限界で誤差が出ます",
+            value="このままだとsinやcosは0に近い値を出す場合浮動小数点演算の限界で誤差が出ます (「高精度」をオンにすると30°/45°の倍数は正確に計算します)",
             color=ft.Colors.WHITE54,
             size=12,
             text_align=ft.TextAlign.CENTER,
@@ -214,6 +176,12 @@ def main(page: ft.Page):
             color=ft.Colors.WHITE54,
             size=12,
             text_align=ft.TextAlign.CENTER,
+        ),
+        ft.Text(
+            value="上の欄に式を入力してEnterでまとめて計算できます (log(A, B) は B を底とする A の対数)",
+            color=ft.Colors.WHITE54,
+            size=12,
+            text_align=ft.TextAlign.CENTER,
         )
     )
 
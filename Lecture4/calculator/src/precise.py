@@ -0,0 +1,238 @@
+import math
+from decimal import Decimal, Overflow, localcontext
+from fractions import Fraction
+from functools import lru_cache
+
+from expression import COMPILE_CACHE_SIZE, OPERATORS, CalcError, CompiledExpression, ExpressionSyntaxError, parse, run
+
+# --- 高精度モード ---
+# 値はすべて Fraction (分数) で持つので、+ - * / % は誤差なく計算できる (1 / 3 * 3 = 1)。
+# √ ・ log ・ sin / cos ・非整数乗のような無理数になる計算だけ decimal で PRECISION 桁まで求め、
+# その結果を Fraction に戻して次の計算に使う。
+# sin / cos は 30° / 45° の倍数なら正確な値 (sin 180 = 0, sin 30 = 1/2, cos 60 = 1/2) を返し、
+# 一度計算した角度は表 (lru_cache) から引く。
+#   evaluate_precise("sin(30) + 1/3")           -> Fraction(5, 6)
+#   format_precise(Fraction(1, 3))              -> "0.3333333333333333333333333333"
+
+PRECISION = 28
+# 無理数は表示より GUARD_DIGITS 桁多く持ち、表示のときに PRECISION 桁に丸める
+# (sin(45) ** 2 や log(e) が 0.4999… / 0.9999… と表示されないように)
+GUARD_DIGITS = 5
+TRIG_CACHE_SIZE = 1024
+# これより大きい整数乗は分数のままだと桁が増えすぎるので decimal で計算する
+MAX_EXACT_EXPONENT = 4096
+# 整数乗の結果 (分子・分母) がこのビット数を超えそうなときも decimal で計算する (1キーで固まらないように)
+MAX_EXACT_BITS = 1 << 15
+
+def to_fraction(value):
+    """表示中の文字列・float・int を Fraction にする (float は見た目どおりの値: 0.1 -> 1/10)"""
+    if isinstance(value, Fraction):
+        return value
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise CalcError("有限の数ではありません")
+        value = repr(value)
+    try:
+        return Fraction(value)
+    except (ValueError, TypeError):
+        raise CalcError(f"数値ではありません: {value!r}") from None
+
+def _decimal(value):
+    """Fraction -> Decimal (現在の桁数に丸める)"""
+    return Decimal(value.numerator) / value.denominator
+
+def _rounded(value, prec):
+    """Decimal を prec + GUARD_DIGITS 桁に丸めて Fraction にする"""
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS
+        return Fraction(+value)
+
+# --- 定数 (桁数ごとに1回だけ計算する) ---
+@lru_cache(maxsize=None)
+def pi(prec=PRECISION):
+    """decimal のドキュメントにある級数で円周率を求める"""
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return _rounded(s, prec)
+
+@lru_cache(maxsize=None)
+def euler(prec=PRECISION):
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        value = Decimal(1).exp()
+    return _rounded(value, prec)
+
+PRECISE_CONSTANTS = {"pi": pi, "e": euler}
+
+# --- sin / cos (度数法) ---
+# 0〜90° のうち正確に分かる値。√ を含むものは桁数ごとに計算する
+EXACT_SIN = {0: Fraction(0), 30: Fraction(1, 2), 90: Fraction(1)}
+ROOT_SIN = {45: 2, 60: 3}  # sin 45 = √2 / 2, sin 60 = √3 / 2
+
+def _sin_series(angle, prec):
+    """0 < angle < 90 の sin をテイラー級数で求める"""
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        x = _decimal(angle) * _decimal(pi(prec)) / 180
+        i, lasts, s, fact, num, sign = 1, 0, x, 1, x, 1
+        while s != lasts:
+            lasts = s
+            i += 2
+            fact *= i * (i - 1)
+            num *= x * x
+            sign *= -1
+            s += num / fact * sign
+    return _rounded(s, prec)
+
+@lru_cache(maxsize=TRIG_CACHE_SIZE)
+def sin_degrees(angle, prec=PRECISION):
+    """度数法の sin。30° / 45° の倍数は正確な値 (√ を含むものと、それ以外の角度は prec 桁)"""
+    angle = to_fraction(angle) % 360
+    sign = 1
+    if angle >= 180:
+        angle -= 180
+        sign = -1
+    if angle > 90:
+        angle = 180 - angle
+    if angle in EXACT_SIN:
+        value = EXACT_SIN[angle]
+    elif angle in ROOT_SIN:
+        value = sqrt(Fraction(ROOT_SIN[angle]), prec) / 2
+    else:
+        value = _sin_series(angle, prec)
+    return sign * value
+
+def cos_degrees(angle, prec=PRECISION):
+    return sin_degrees(to_fraction(angle) + 90, prec)
+
+# --- 演算子 ---
+def sqrt(a, prec=PRECISION):
+    if a < 0:
+        raise CalcError("負の数の平方根は計算できません")
+    # 分子・分母がどちらも平方数なら正確に求まる (√(9/4) = 3/2)
+    num, den = math.isqrt(a.numerator), math.isqrt(a.denominator)
+    if num * num == a.numerator and den * den == a.denominator:
+        return Fraction(num, den)
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        value = _decimal(a).sqrt()
+    return _rounded(value, prec)
+
+def _exact_power_fits(a, k):
+    """a ** k (k は整数) を分数のまま計算しても MAX_EXACT_BITS に収まるか (計算する前に見積もる)"""
+    return max(a.numerator.bit_length(), a.denominator.bit_length()) * abs(k) <= MAX_EXACT_BITS
+
+def power(a, b, prec=PRECISION):
+    if b.denominator == 1 and abs(b) <= MAX_EXACT_EXPONENT and _exact_power_fits(a, int(b)):
+        if a == 0 and b < 0:
+            raise CalcError("0 の負の数乗は計算できません")
+        return a ** int(b)
+    sign = 1
+    if a < 0:
+        if b.denominator != 1:
+            raise CalcError("負の数の非整数乗は計算できません")
+        a, sign = -a, (-1 if b.numerator % 2 else 1)
+    if a == 0:
+        if b < 0:
+            raise CalcError("0 の負の数乗は計算できません")
+        return Fraction(0)
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        try:
+            value = _decimal(a) ** _decimal(b)
+        except Overflow:
+            raise CalcError("計算結果が大きすぎます") from None
+    return sign * _rounded(value, prec)
+
+def log(a, base=None, prec=PRECISION):
+    if a <= 0:
+        raise CalcError("0 以下の対数は計算できません")
+    if base is not None and (base <= 0 or base == 1):
+        raise CalcError("対数の底は 1 以外の正の数にしてください")
+    with localcontext() as ctx:
+        ctx.prec = prec + GUARD_DIGITS + 2
+        value = _decimal(a).ln()
+        if base is not None:
+            value /= _decimal(base).ln()
+    if base is not None:
+        # log(8, 2) のように底の整数乗なら正確な整数を返す
+        k = round(value)
+        if abs(k) <= MAX_EXACT_EXPONENT and _exact_power_fits(base, k) and base ** k == a:
+            return Fraction(k)
+    return _rounded(value, prec)
+
+def divide(a, b):
+    if b == 0:
+        raise CalcError("0 で割ることはできません")
+    return a / b
+
+@lru_cache(maxsize=None)
+def precise_ops(prec=PRECISION):
+    """expression.run に渡す演算子表 (expression.SCALAR_OPS と同じ名前)"""
+    return {
+        "+": lambda a, b: a + b,
+        "-": lambda a, b: a - b,
+        "*": lambda a, b: a * b,
+        "/": divide,
+        "**": lambda a, b: power(a, b, prec),
+        "neg": lambda a: -a,
+        "%": lambda a: a / 100,
+        "sin": lambda a: sin_degrees(a, prec),
+        "cos": lambda a: cos_degrees(a, prec),
+        "log": lambda a, base=None: log(a, base, prec),
+        "√": lambda a: sqrt(a, prec),
+    }
+
+# --- 式の評価 ---
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_precise(text):
+    """数値を Fraction のまま読んだバイトコード
+
+    定数の畳み込み (float で計算する) は行わず、pi / e は評価時に桁数に合わせて渡す。
+    """
+    compiled = CompiledExpression(text, parse(text, Fraction, {}))
+    compiled.variables = tuple(v for v in compiled.variables if v not in PRECISE_CONSTANTS)
+    return compiled
+
+def evaluate_precise(text, prec=PRECISION, **env):
+    """式を Fraction で計算する。計算できなければ CalcError"""
+    compiled = compile_precise(text)
+    values = {name: make(prec) for name, make in PRECISE_CONSTANTS.items()}
+    values.update((name, to_fraction(value)) for name, value in env.items())
+    try:
+        return run(compiled.code, values, precise_ops(prec))
+    except (ArithmeticError, ValueError) as e:
+        if isinstance(e, (CalcError, ExpressionSyntaxError)):
+            raise
+        raise CalcError(str(e)) from None
+
+def apply_precise(operator, operand1, operand2, prec=PRECISION):
+    """expression.apply_operator の高精度版 (ボタン操作1回分)"""
+    func = precise_ops(prec)[operator]
+    a, b = to_fraction(operand1), to_fraction(operand2)
+    try:
+        return func(a) if OPERATORS[operator][1] == (1,) else func(a, b)
+    except (ArithmeticError, ValueError) as e:
+        if isinstance(e, CalcError):
+            raise
+        raise CalcError(str(e)) from None
+
+def format_precise(value, prec=PRECISION):
+    """表示用の文字列。整数はそのまま、それ以外は prec 桁に丸めて末尾の 0 を取る"""
+    with localcontext() as ctx:
+        ctx.prec = prec
+        number = (+_decimal(to_fraction(value))).normalize()
+    if number.is_zero():
+        return "0"
+    # 桁数に収まる範囲は指数表記にしない
+    if -7 < number.adjusted() < prec:
+        return format(number, "f")
+    return str(number)
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from collections import deque
+
+# --- 最新の操作だけを処理する非同期ハンドラ用ヘルパー ---
+# Flet の async ハンドラから、通信やDB読み込みなどの重い処理を別スレッドに逃がして
+# イベントループ (他のドロップダウン操作) を止めないようにする。
+# 続けて別の都道府県が選ばれたら、前のハンドラの待ち合わせをキャンセルして結果を捨てる。
+# (スレッド内の requests / sqlite3 は途中で止められないので、結果を表示しないことで打ち切る)
+
+# 直近の計測結果をいくつ残すか
+LATENCY_HISTORY_SIZE = 100
+
+class LatestOnly:
+    def __init__(self):
+        self._task = None
+
+    def claim(self):
+        """実行中のハンドラを最新とし、まだ終わっていない古いハンドラをキャンセルする"""
+        current = asyncio.current_task()
+        if self._task is not None and self._task is not current and not self._task.done():
+            self._task.cancel()
+        self._task = current
+
+    async def run(self, func, *args, **kwargs):
+        """func を別スレッドで実行して結果を待つ (新しい claim() があれば CancelledError)"""
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+class EventLatency:
+    """イベント発生から画面に反映されるまでの時間を計測する"""
+
+    history = deque(maxlen=LATENCY_HISTORY_SIZE)
+
+    def __init__(self, name, key=""):
+        self.name = name
+        self.key = key
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, label):
+        """イベント発生からの経過時間 (ms) を記録する"""
+        self.marks.append((label, (time.perf_counter() - self.start) * 1000))
+
+    def done(self, status="表示"):
+        self.mark(status)
+        EventLatency.history.append((self.name, self.key, self.marks))
+        detail = " / ".join(f"{label} {ms:.0f}ms" for label, ms in self.marks)
+        print(f"⏱️ {self.name} {self.key}: {detail}")
+
+    def cancelled(self):
+        self.done("キャンセル")
@@ -1,20 +1,29 @@
 import flet as ft
 import requests
 import json
+import asyncio
 from datetime import datetime
 
+from area_index import LEVEL_LABELS
+from area_store import AreaStore
+from http_cache import HttpCache
+from latest_task import EventLatency, LatestOnly
+from publication import is_report_fresh, staleness
+
 # --- 定数 ---
 AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
+# 地名検索で一覧に出す候補の数
+SEARCH_LIMIT = 20
+# 発表の鮮度 (publication.staleness の状態) ごとの表示色
+STALENESS_COLORS = {"fresh": ft.Colors.GREEN_700, "stale": ft.Colors.ORANGE_700, "old": ft.Colors.RED_700}
+
+# ETag / Last-Modified で条件付きリクエストを送り、変化がなければ保存済みのJSONを使う
+HTTP_CACHE = HttpCache()
 
-# グローバル変数として地域データを保持
-try:
-    AREA_RESPONSE = requests.get(AREA_URL, timeout=10)
-    AREA_RESPONSE.raise_for_status()
-    AREA_JSON = AREA_RESPONSE.json()
-except requests.exceptions.RequestException as e:
-    AREA_JSON = None
-    print(f"起動エラー: 地域データの取得に失敗しました。{e}")
+# 地域データはローカルのスナップショット (前回取得分) から読み、最新版は画面表示後に取得する
+AREA_STORE = AreaStore(HTTP_CACHE, AREA_URL)
+AREA_STORE.load_snapshot()
 
 # --- 天気アイコンマッピング ---
 def get_weather_icon(weather_text):
@@ -68,15 +77,9 @@ def main(page: ft.Page):
     page.padding = 20
     page.scroll = "adaptive"
     
-    # 起動時のエラー処理
-    if AREA_JSON is None:
-        page.add(ft.Text("地域データのロードに失敗したため、アプリを起動できません。", color=ft.Colors.RED))
-        page.update()
-        return
-
     # 表示用コンテナ
     weather_content = ft.Column(
-        [ft.Text("地方と都道府県を選択してください", size=16)],
+        [ft.Text("地名を検索して都道府県を選択してください", size=16)],
         spacing=10
     )
     weather_container = ft.Container(
@@ -87,21 +90,15 @@ def main(page: ft.Page):
         width=800
     )
 
-    # 都道府県ドロップダウン
-    office_dropdown = ft.Dropdown(
-        label="都道府県",
-        width=300,
-        disabled=True,
-        hint_text="地方を選択すると有効になります"
+    # 地名検索 (地方 → 都道府県の2段のドロップダウンの代わり)
+    place_search = ft.SearchBar(
+        bar_hint_text="地名・よみで検索 (例: 札幌 / さっぽろ)",
+        view_hint_text="地名・よみを入力",
+        width=420,
+        disabled=AREA_STORE.data is None,
+        controls=[]
     )
 
-    # 地方ドロップダウンのオプション作成
-    center_options = []
-    for code, info in AREA_JSON["centers"].items():
-        center_options.append(
-            ft.dropdown.Option(key=code, text=info["name"])
-        )
-    
     # --- ヘルパー関数 ---
     def format_date(iso_time_str):
         """ISO 8601形式の時間を 'MM/DD(曜日)' 形式に変換する"""
@@ -112,77 +109,47 @@ def main(page: ft.Page):
         except ValueError:
             return ""
 
-    # 地方選択時のイベント
-    def on_center_change(e):
-        selected_center_code = e.control.value
-        office_codes_in_center = AREA_JSON["centers"].get(selected_center_code, {}).get("children", [])
-        new_office_options = []
-        for office_code in office_codes_in_center:
-            if office_code in AREA_JSON["offices"]:
-                info = AREA_JSON["offices"][office_code]
-                new_office_options.append(
-                    ft.dropdown.Option(key=office_code, text=info["name"])
-                )
-        
-        office_dropdown.options = new_office_options
-        office_dropdown.value = None
-        office_dropdown.disabled = False
-        weather_content.controls = [
-            ft.Text(f'{AREA_JSON["centers"][selected_center_code]["name"]} 内の都道府県を選択してください。', size=16)
-        ]
-        page.update()
+    # 検索候補の1行
+    def search_result_tile(node):
+        office = AREA_STORE.data.office_of(node)
+        where = LEVEL_LABELS[node.level_name]
+        if office is not None and office != node:
+            where = f"{office.name} の{where}"
 
-    # 都道府県選択時のイベント
-    def on_office_change(e):
-        selected_office_code = e.control.value
-        if not selected_office_code:
-            return
+        async def on_click(e):
+            if office is None:
+                # 地方を選んだら、その中の都道府県を候補に出す
+                place_search.controls = [search_result_tile(child) for child in node.children]
+                place_search.update()
+                return
+            place_search.close_view(node.name)
+            await show_office(office)
 
-        # ローディング表示
-        weather_content.controls = [
-            ft.ProgressRing(),
-            ft.Text("天気データを取得中...", size=16)
-        ]
-        page.update()
+        return ft.ListTile(title=ft.Text(node.name), subtitle=ft.Text(where, size=12, color=ft.Colors.GREY_700), on_click=on_click)
 
-        try:
-            forecast_url = FORECAST_URL.format(selected_office_code)
-            print(f"リクエストURL: {forecast_url}")
-            
-            forecast_response = requests.get(forecast_url, timeout=10)
-            print(f"ステータスコード: {forecast_response.status_code}")
-            
-            forecast_response.raise_for_status()
-            forecast_json = forecast_response.json()
-            print(f"データ取得成功")
-            
-        except requests.exceptions.Timeout:
-            weather_content.controls = [
-                ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
-                ft.Text("タイムアウト: サーバーからの応答がありません。", color=ft.Colors.RED, size=16),
-                ft.Text("しばらくしてから再度お試しください。", size=14)
-            ]
-            page.update()
-            return
-        except requests.exceptions.HTTPError as http_err:
-            weather_content.controls = [
-                ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
-                ft.Text(f"HTTPエラー: {http_err}", color=ft.Colors.RED, size=16),
-                ft.Text(f"ステータスコード: {forecast_response.status_code}", size=14)
-            ]
-            page.update()
+    # 検索語が変わったときのイベント
+    def on_search_change(e):
+        if AREA_STORE.data is None:
             return
-        except requests.exceptions.RequestException as req_err:
-            weather_content.controls = [
-                ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
-                ft.Text(f"ネットワークエラー: {req_err}", color=ft.Colors.RED, size=16),
-                ft.Text("インターネット接続を確認してください。", size=14)
-            ]
-            page.update()
+        nodes = AREA_STORE.data.search(e.data, limit=SEARCH_LIMIT) if e.data else AREA_STORE.data.centers()
+        place_search.controls = [search_result_tile(n) for n in nodes] or [
+            ft.ListTile(title=ft.Text("見つかりません", color=ft.Colors.GREY_700))
+        ]
+        place_search.update()
+
+    # Enter では一番上の候補を選ぶ
+    async def on_search_submit(e):
+        nodes = AREA_STORE.data.search(e.data, limit=1) if AREA_STORE.data else []
+        office = AREA_STORE.data.office_of(nodes[0]) if nodes else None
+        if office is None:
             return
-        
+        place_search.close_view(nodes[0].name)
+        await show_office(office)
+
+    # 予報JSONから表示内容を組み立てる (note は鮮度の後ろに付ける補足)
+    def render_forecast(office_node, forecast_json, note=""):
         try:
-            office_name = AREA_JSON["offices"][selected_office_code]["name"]
+            office_name = office_node.name
             
             # --- 予報データの抽出 ---
             daily_forecast = forecast_json[0]["timeSeries"][0]
@@ -205,9 +172,15 @@ def main(page: ft.Page):
             time_defines_temp = temp_forecast["timeDefines"]
             temps = temp_area["temps"]
             
+            # 発表時刻から鮮度を出す (保存済みの予報を表示しているときも同じ)
+            state, label = staleness(forecast_json[0].get("reportDatetime"))
+            if note:
+                label += f" ・{note}"
+
             # --- 表示内容の組み立て ---
             new_controls = [
-                ft.Text(f"📍 {office_name} の最新予報", size=24, weight="bold", color=ft.Colors.DEEP_PURPLE_700),
+                ft.Text(f"📍 {office_name} の予報", size=24, weight="bold", color=ft.Colors.DEEP_PURPLE_700),
+                ft.Text(f"更新: {label}", size=12, color=STALENESS_COLORS[state]),
                 ft.Divider(height=2, thickness=2),
             ]
             
@@ -328,30 +301,123 @@ def main(page: ft.Page):
                 ft.Text("天気情報の解析に失敗しました。", color=ft.Colors.RED, size=16),
                 ft.Text(f"エラー詳細: {str(ex)}", size=12, color=ft.Colors.GREY_700)
             ]
-            
+
+    # 通信エラーの表示
+    def network_error_controls(err):
+        if isinstance(err, requests.exceptions.Timeout):
+            return [
+                ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
+                ft.Text("タイムアウト: サーバーからの応答がありません。", color=ft.Colors.RED, size=16),
+                ft.Text("しばらくしてから再度お試しください。", size=14)
+            ]
+        if isinstance(err, requests.exceptions.HTTPError):
+            return [
+                ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
+                ft.Text(f"HTTPエラー: {err}", color=ft.Colors.RED, size=16),
+                ft.Text(f"ステータスコード: {err.response.status_code}", size=14)
+            ]
+        return [
+            ft.Icon(ft.Icons.ERROR_OUTLINE, size=50, color=ft.Colors.RED),
+            ft.Text(f"ネットワークエラー: {err}", color=ft.Colors.RED, size=16),
+            ft.Text("インターネット接続を確認してください。", size=14)
+        ]
+
+    # 都道府県の取得は最後に選ばれたものだけを表示する
+    latest_fetch = LatestOnly()
+
+    # 都道府県選択時の処理
+    # 保存済みの予報があれば通信を待たずにすぐ表示し、最新の発表は裏で確認して届いたら差し替える
+    # (async にして通信は別スレッドで待つ。待っている間も他の操作を受け付ける)
+    async def show_office(office_node):
+        selected_office_code = office_node.code
+        latency = EventLatency("都道府県選択", selected_office_code)
+        # 前の都道府県の取得がまだ終わっていなければキャンセルする
+        latest_fetch.claim()
+        forecast_url = FORECAST_URL.format(selected_office_code)
+
+        try:
+            cached_json = await latest_fetch.run(HTTP_CACHE.load, forecast_url)
+        except asyncio.CancelledError:
+            latency.cancelled()
+            return
+        report = cached_json[0].get("reportDatetime") if isinstance(cached_json, list) and cached_json else None
+        fresh = is_report_fresh(report)
+
+        if cached_json is not None:
+            render_forecast(office_node, cached_json, "" if fresh else "🔄 最新の発表を確認中")
+        else:
+            # ローディング表示
+            weather_content.controls = [
+                ft.ProgressRing(),
+                ft.Text("天気データを取得中...", size=16)
+            ]
+        page.update()
+        latency.mark("初回描画")
+        if fresh:
+            # 直近の発表 (05/11/17時) を保存済みなら取り直さない
+            latency.done("保存済み")
+            return
+
+        try:
+            print(f"リクエストURL: {forecast_url}")
+            forecast_json, not_modified = await latest_fetch.run(HTTP_CACHE.get, forecast_url, timeout=10)
+            print("データ取得成功 (304: キャッシュを使用)" if not_modified else "データ取得成功")
+            latency.mark("取得")
+        except asyncio.CancelledError:
+            # 別の都道府県が選ばれた。画面はそちらのハンドラが更新する
+            latency.cancelled()
+            return
+        except requests.exceptions.RequestException as req_err:
+            print(f"取得エラー: {req_err}")
+            if cached_json is not None:
+                # 保存済みの予報は表示したまま、オフラインであることだけ知らせる
+                render_forecast(office_node, cached_json, "📴 オフライン: 保存済みの予報を表示中")
+            else:
+                weather_content.controls = network_error_controls(req_err)
+            page.update()
+            latency.done("エラー")
+            return
+
+        render_forecast(office_node, forecast_json)
         page.update()
+        latency.done()
         
-    # 地方ドロップダウン
-    center_dropdown = ft.Dropdown(
-        label="地方",
-        options=center_options,
-        on_change=on_center_change,
-        width=300,
-        hint_text="地方を選択"
-    )
-    
-    office_dropdown.on_change = on_office_change
+    place_search.on_change = on_search_change
+    place_search.on_submit = on_search_submit
+    if AREA_STORE.data is not None:
+        place_search.controls = [search_result_tile(n) for n in AREA_STORE.data.centers()]
+
+    # 最新の地域データが届いたら検索の候補を差し替える
+    def on_area_update(area_index):
+        if area_index is None:
+            if AREA_STORE.data is None:
+                weather_content.controls = [
+                    ft.Text("地域データのロードに失敗しました。インターネット接続を確認してください。", color=ft.Colors.RED)
+                ]
+        else:
+            place_search.controls = [search_result_tile(n) for n in area_index.centers()]
+            place_search.disabled = False
+            if not place_search.value:
+                weather_content.controls = [ft.Text("地名を検索して都道府県を選択してください", size=16)]
+        page.update()
+
+    if AREA_STORE.data is None:
+        # 初回起動でスナップショットがない場合は取得中と表示する
+        weather_content.controls = [ft.ProgressRing(), ft.Text("地域データを取得中...", size=16)]
+    AREA_STORE.add_listener(on_area_update)
+    page.on_disconnect = lambda e: AREA_STORE.remove_listener(on_area_update)
 
     # 画面配置
     page.add(
         ft.Column(
             [
                 ft.Text("🌤️ 天気予報アプリ", size=28, weight="bold", color=ft.Colors.BLUE_700),
-                ft.Row([center_dropdown, office_dropdown], spacing=20),
+                place_search,
                 weather_container,
             ],
             spacing=20
         )
     )
+    AREA_STORE.refresh_async()
 
 ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+# --- 発表時刻と鮮度 ---
+# 気象庁の府県予報は毎日 05/11/17時 (JST) に発表される。
+# 保存済みの予報の reportDatetime をこれと比べて、取り直しが必要か・画面にどう表示するかを決める。
+
+# 気象庁の予報発表時刻 (JST)
+JST = timezone(timedelta(hours=9))
+PUBLISH_HOURS = (5, 11, 17)
+# これより古い発表は「古い」として目立たせる
+OLD_REPORT_AGE = timedelta(days=1)
+
+def latest_publication_time(now=None):
+    """直近の予報発表時刻 (05/11/17時 JST) を返す"""
+    now = (now or datetime.now(JST)).astimezone(JST)
+    for hour in reversed(PUBLISH_HOURS):
+        slot = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if slot <= now:
+            return slot
+    # 05時より前なら前日の最終発表
+    prev = now - timedelta(days=1)
+    return prev.replace(hour=PUBLISH_HOURS[-1], minute=0, second=0, microsecond=0)
+
+def next_publication_time(now=None):
+    """次の予報発表時刻 (05/11/17時 JST) を返す"""
+    now = (now or datetime.now(JST)).astimezone(JST)
+    for hour in PUBLISH_HOURS:
+        slot = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        if slot > now:
+            return slot
+    # 17時以降なら翌日の最初の発表
+    nxt = now + timedelta(days=1)
+    return nxt.replace(hour=PUBLISH_HOURS[0], minute=0, second=0, microsecond=0)
+
+def is_report_fresh(report_datetime, now=None):
+    """report_datetime が直近の発表時刻以降なら True (再取得不要)"""
+    if not report_datetime:
+        return False
+    return datetime.fromisoformat(report_datetime) >= latest_publication_time(now)
+
+def staleness(report_datetime, now=None):
+    """(状態, 表示用の文言)。状態は 'fresh' (最新) / 'stale' (新しい発表がある) / 'old' (1日以上前)"""
+    if not report_datetime:
+        return "old", "発表時刻不明"
+    now = (now or datetime.now(JST)).astimezone(JST)
+    report = datetime.fromisoformat(report_datetime).astimezone(JST)
+    when = report.strftime("%m/%d %H:%M")
+    if report >= latest_publication_time(now):
+        return "fresh", f"{when} 発表 (最新)"
+    hours = int((now - report).total_seconds() // 3600)
+    ago = f"{hours // 24}日前" if hours >= 24 else f"{hours}時間前"
+    state = "old" if now - report >= OLD_REPORT_AGE else "stale"
+    return state, f"{when} 発表 ({ago}・新しい発表があります)"
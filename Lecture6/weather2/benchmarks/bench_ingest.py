@@ -0,0 +1,59 @@
+"""短期予報の行組み立てのマイクロベンチマーク
+
+    python benchmarks/bench_ingest.py [地域数] [日数]
+
+timeDefines を毎回 startswith で走査する旧実装と、
+日付索引で結合する ingest.build_short_rows を比較する。
+"""
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fixtures import make_forecast
+from ingest import build_short_rows
+
+def legacy_build_short_rows(data, parent_code):
+    """比較用: 索引を使わない旧実装 (時刻ごとに全 timeDefines を走査)"""
+    rows = []
+    ts_weather = data['timeSeries'][0]
+    ts_pops, ts_temps = data['timeSeries'][1], data['timeSeries'][2]
+    for area_idx, area_data in enumerate(ts_weather['areas']):
+        for time_idx, t_str in enumerate(ts_weather['timeDefines']):
+            target_date = datetime.fromisoformat(t_str).strftime('%Y-%m-%d')
+            temps_list = []
+            for t_idx, t_time in enumerate(ts_temps['timeDefines']):
+                if t_time.startswith(target_date):
+                    val = ts_temps['areas'][area_idx]['temps'][t_idx]
+                    if val and val.strip(): temps_list.append(val)
+            pops_list = []
+            for p_idx, p_time in enumerate(ts_pops['timeDefines']):
+                if p_time.startswith(target_date):
+                    val = ts_pops['areas'][area_idx]['pops'][p_idx]
+                    hh = datetime.fromisoformat(p_time).strftime("%H")
+                    if val and val.strip(): pops_list.append(f"{hh}時:{val}%")
+            rows.append((area_data['area']['code'], parent_code, target_date,
+                         ",".join(temps_list), ",".join(pops_list)))
+    return rows
+
+def main():
+    n_areas = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+    short = make_forecast(n_areas=n_areas, days=days)[0]
+
+    # 結果が一致することを先に確認する
+    new_rows = build_short_rows(short, "130000").forecasts
+    old_rows = legacy_build_short_rows(short, "130000")
+    assert [(r[0], r[3], r[8], r[9]) for r in new_rows] == [(r[0], r[2], r[3], r[4]) for r in old_rows]
+
+    number = 20
+    old = min(timeit.repeat(lambda: legacy_build_short_rows(short, "130000"), number=number, repeat=3)) / number
+    new = min(timeit.repeat(lambda: build_short_rows(short, "130000"), number=number, repeat=3)) / number
+    print(f"地域数={n_areas} 日数={days} 行数={len(new_rows)}")
+    print(f"  旧実装 (startswith走査): {old * 1000:8.2f} ms")
+    print(f"  新実装 (日付索引)       : {new * 1000:8.2f} ms  ({old / new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
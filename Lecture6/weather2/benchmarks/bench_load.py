@@ -0,0 +1,161 @@
+"""スタブサーバー相手に weather2 の取り込みと表示用クエリに負荷をかける
+
+    python benchmarks/bench_load.py [--rounds 6] [--sessions 16] [--latency-ms 30] [--error-rate 0.02]
+                                    [--fixtures DIR] [--max-p99-ms 50]
+
+1. 取り込み: stub_server.StubJMA から全オフィスの予報を取得して sync_all_data に流す。
+   発表時刻を進めながら --rounds 回繰り返し、DBに履歴を溜める。
+2. 表示: --sessions 個のスレッドがランダムなオフィス・日付で get_available_dates と
+   get_forecasts_by_date を呼ぶ (DB直接と、共有キャッシュ付きの ForecastService の両方)。
+
+それぞれの p50 / p99 レイテンシ・スループットと、最後のDBサイズ (圧縮の前後) を表示する。
+--max-p99-ms を超えた表示用クエリがあれば終了コード 1 を返す。
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import jma_client
+from database import WeatherDatabase
+from forecast_service import ForecastService
+from stub_server import StubJMA
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def report_line(name, samples, seconds):
+    """名前 / 件数 / p50 / p99 / スループット の1行"""
+    if not samples:
+        return f"{name:<22} {'-':>8}"
+    return (f"{name:<22} {len(samples):>8,} {percentile(samples, 50):>8.2f}ms "
+            f"{percentile(samples, 99):>8.2f}ms {len(samples) / seconds:>10,.0f}/s")
+
+def timed(samples, lock, func):
+    """func の所要時間 (ms) を samples に追加する"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with lock:
+                samples.append((time.perf_counter() - start) * 1000)
+    return wrapper
+
+def db_size_mb(path):
+    directory, name = os.path.split(path)
+    return sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory) if f.startswith(name)) / 1024 / 1024
+
+def run_ingest(db, stub, rounds, workers, start=datetime(2026, 1, 1, 5)):
+    """発表時刻を進めながら全オフィスを rounds 回取り込む。(同期の所要時間, 取り込みの所要時間, 経過秒, 失敗数)"""
+    sync_ms, write_ms, lock = [], [], threading.Lock()
+    original = db.sync_all_data
+    db.sync_all_data = timed(write_ms, lock, original)
+    sync = timed(sync_ms, lock, jma_client.sync_office)
+    offices = list(stub.area_json["offices"])
+    failures = 0
+    begin = time.perf_counter()
+    try:
+        for r in range(rounds):
+            # 1日3回の発表 (05/11/17時) を順に出す
+            report = start + timedelta(days=r // 3, hours=6 * (r % 3))
+            stub.publish(report.isoformat() + "+09:00")
+            _, failed = jma_client.prefetch_all(db, offices, max_workers=workers, url_template=stub.forecast_url,
+                                                sync=sync, retries=2, backoff=0.05)
+            failures += len(failed)
+    finally:
+        db.sync_all_data = original
+    return sync_ms, write_ms, time.perf_counter() - begin, failures
+
+def run_reads(reader, offices, dates, sessions, per_session, seed=0):
+    """sessions 個のスレッドで表示用クエリを投げる。(日付一覧の所要時間, 日付別の所要時間, 経過秒)"""
+    dates_ms, rows_ms, lock = [], [], threading.Lock()
+    get_dates = timed(dates_ms, lock, reader.get_available_dates)
+    get_rows = timed(rows_ms, lock, reader.get_forecasts_by_date)
+
+    def session(n):
+        rnd = random.Random(seed + n)
+        for _ in range(per_session):
+            office = rnd.choice(offices)
+            get_dates(office)
+            get_rows(office, rnd.choice(dates))
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    begin = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return dates_ms, rows_ms, time.perf_counter() - begin
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="weather2 の負荷試験")
+    parser.add_argument("--rounds", type=int, default=6, help="取り込む発表の回数")
+    parser.add_argument("--workers", type=int, default=jma_client.PREFETCH_WORKERS)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200, help="1セッションあたりのクエリ数")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--fixtures", help="stub_server.py --record で保存したJSON")
+    parser.add_argument("--max-p99-ms", type=float, help="表示用クエリの p99 の上限")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubJMA(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate) as stub:
+        db_path = os.path.join(tmp, "load.db")
+        db = WeatherDatabase(db_path)
+        offices = list(stub.area_json["offices"])
+        print(f"オフィス {len(offices)} 件 / 発表 {args.rounds} 回 / 遅延 {args.latency_ms:.0f}±{args.jitter_ms:.0f}ms"
+              f" / エラー率 {args.error_rate:.0%}")
+
+        sync_ms, write_ms, ingest_s, failures = run_ingest(db, stub, args.rounds, args.workers)
+        dates = sorted({d for o in offices for d in db.get_available_dates(o)})
+
+        print(f"\n{'':<22} {'件数':>8} {'p50':>10} {'p99':>10} {'スループット':>12}")
+        print(report_line("取得+同期 (1オフィス)", sync_ms, ingest_s))
+        print(report_line("sync_all_data", write_ms, ingest_s))
+
+        results = {}
+        for name, reader in (("DB直接", db), ("共有サービス", None)):
+            service = None
+            if reader is None:
+                service = reader = ForecastService(db_path)
+            dates_ms, rows_ms, seconds = run_reads(reader, offices, dates, args.sessions, args.queries)
+            results[f"{name} 日付一覧"] = dates_ms
+            results[f"{name} 日付別"] = rows_ms
+            print(report_line(f"{name} 日付一覧", dates_ms, seconds))
+            print(report_line(f"{name} 日付別", rows_ms, seconds))
+            if service:
+                print(f"  共有キャッシュ: {service.stats()}")
+                service.close()
+
+        with db.pool.reader() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+        print(f"\nDB: {total:,} 行 / {db_size_mb(db_path):.1f}MB"
+              f" / HTTP {dict(sorted(stub.counts.items()))} / 取得失敗 {failures} 件")
+        # 最後の発表の翌日に圧縮した場合 (表示用は最新の発表だけ、履歴はアーカイブに残る)
+        compact_at = datetime.fromisoformat(stub.report) + timedelta(days=1)
+        db.compact(now=compact_at)
+        with db.pool.reader() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+        db.close()
+        print(f"圧縮後: {total:,} 行 / {db_size_mb(db_path):.1f}MB")
+
+    if args.max_p99_ms is not None:
+        slow = {name: percentile(ms, 99) for name, ms in results.items() if percentile(ms, 99) > args.max_p99_ms}
+        for name, p99 in slow.items():
+            print(f"🐢 {name}: p99 {p99:.2f}ms > {args.max_p99_ms}ms")
+        return 1 if slow else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
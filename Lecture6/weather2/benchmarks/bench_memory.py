@@ -0,0 +1,68 @@
+"""地域データと予報JSONの読み込みのピークメモリを測る
+
+    python benchmarks/bench_memory.py [予報の地域数]
+
+tracemalloc で、読み込み中のピークと読み込み後に残るメモリを比較する。
+  旧方式: json.loads で全体を辞書にする (地域データは area.json 全体を保持)
+  新方式: area_store.load_area_index で逐次読む
+          (地域の索引は検索キーを最初の検索で作るので、検索した後の量も出す)
+予報JSONは取り込みの前に ingest.latest_report_datetime_from_file で発表時刻だけを読むので、その量も出す。
+ijson がインストールされていなければ新方式も json で読むので、差は保持する量だけになる。
+"""
+import gc
+import io
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import area_store
+import ingest
+from area_index import AreaIndex
+from fixtures import make_area_json, make_forecast
+
+def measure(func):
+    """func() の (戻り値, ピークKiB, 実行後も残っているKiB)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / 1024, current / 1024
+
+def searched(index):
+    index.search("し")
+    return index
+
+def main():
+    n_areas = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    area_body = json.dumps(make_area_json(), ensure_ascii=False).encode("utf-8")
+    forecast_body = json.dumps(make_forecast(n_areas=n_areas, days=7), ensure_ascii=False).encode("utf-8")
+    print(f"ijson: {'あり (' + area_store.ijson.backend + ')' if area_store.ijson else 'なし'}")
+    print(f"area.json {len(area_body) / 1024:.0f} KiB / 予報JSON {len(forecast_body) / 1024:.0f} KiB (地域数 {n_areas})")
+
+    cases = [
+        ("地域データ 旧 (全体を保持)", lambda: json.loads(area_body)),
+        ("地域データ 新 (逐次+索引)", lambda: area_store.load_area_index(io.BytesIO(area_body))),
+        # 検索キーは最初の検索で作るので、検索した後に残る量も測る
+        ("地域データ 新 (+検索キー)", lambda: searched(area_store.load_area_index(io.BytesIO(area_body)))),
+        ("予報取り込み (json.loads)", lambda: ingest.build_forecast_rows(json.loads(forecast_body), "130000")),
+        ("予報 発表時刻だけ (逐次)", lambda: ingest.latest_report_datetime_from_file(io.BytesIO(forecast_body))),
+    ]
+    print(f"{'':<28} {'ピーク':>10} {'保持':>10}")
+    results = []
+    for name, func in cases:
+        result, peak, kept = measure(func)
+        results.append(result)
+        print(f"{name:<28} {peak:>8,.0f}KiB {kept:>8,.0f}KiB")
+
+    # 新旧で同じ内容になることを確認する
+    assert results[1].to_rows() == AreaIndex.from_area_json(results[0]).to_rows()
+    assert results[4] == results[3].latest_report_datetime()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""履歴が増えても表示用クエリのコストが一定かを測る
+
+    python benchmarks/bench_queries.py [オフィス数]
+
+1か月 / 3か月 / 1年分の発表履歴 (1日3回) を入れたDBで、
+get_available_dates と get_forecasts_by_date の所要時間を測る。
+(日付一覧は返す日付の数に比例して伸びるが、日付別の取得は期間によらずほぼ一定になる)
+比較用に、索引を使わず全行を Python で重複排除する旧方式も測る。
+あわせて「降水確率70%以上の地域」の検索 (find_areas_by_pop) の所要時間も測る。
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from database import SELECT_FORECASTS_BY_DATE_SQL, WeatherDatabase
+from fixtures import make_forecast
+from ingest import ForecastBatch, build_forecast_rows
+
+def load_history(db, offices, days, start=datetime(2025, 1, 1)):
+    """days 日分 × 1日3回の発表を offices 件ぶん書き込む"""
+    batch = ForecastBatch()
+    for d in range(days):
+        for hour in (5, 11, 17):
+            report = (start + timedelta(days=d, hours=hour)).isoformat() + "+09:00"
+            for n, office in enumerate(offices):
+                batch.extend(build_forecast_rows(make_forecast(office, report=report, seed=d * 31 + n), office))
+        if len(batch) > 50000:
+            db.write_rows(batch)
+            batch = ForecastBatch()
+    db.write_rows(batch)
+    return start + timedelta(days=days - 1)
+
+def legacy_forecasts_by_date(db, parent_code, target_date):
+    """比較用: 索引を使わずに全行を取得して Python で重複排除する旧方式"""
+    with db.pool.reader() as conn:
+        rows = conn.execute("SELECT area_name, data_source, report_datetime FROM forecasts NOT INDEXED "
+                            "WHERE parent_code = ? AND target_date = ?", (parent_code, target_date)).fetchall()
+    unique = {}
+    for row in rows:
+        rank = (row[1] == 'short', row[2])
+        if row[0] not in unique or rank > unique[row[0]][0]:
+            unique[row[0]] = (rank, row)
+    return [r for _, r in unique.values()]
+
+def measure(func, number=50):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1000
+
+def main():
+    n_offices = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    offices = [f"{i + 1:02d}0000" for i in range(n_offices)]
+    office = offices[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = WeatherDatabase(os.path.join(tmp, "bench.db"))
+        print(f"{'期間':>6} {'行数':>10} {'DBサイズ':>10} {'日付一覧':>10} {'日付別(新)':>11} {'日付別(旧)':>11} {'降水≥70%':>10}")
+        loaded = 0
+        for days in (30, 90, 365):
+            last = load_history(db, offices, days - loaded, start=datetime(2025, 1, 1) + timedelta(days=loaded))
+            loaded = days
+            target = (last + timedelta(days=1)).strftime("%Y-%m-%d")
+
+            with db.pool.reader() as conn:
+                total = conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+                plan = conn.execute("EXPLAIN QUERY PLAN " + SELECT_FORECASTS_BY_DATE_SQL, (office, target)).fetchall()
+            size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith("bench.db"))
+
+            dates_ms = measure(lambda: db.get_available_dates(office))
+            new_ms = measure(lambda: db.get_forecasts_by_date(office, target))
+            old_ms = measure(lambda: legacy_forecasts_by_date(db, office, target), number=5)
+            pop_ms = measure(lambda: db.find_areas_by_pop(target, 70))
+            assert len(db.get_forecasts_by_date(office, target)) == len(legacy_forecasts_by_date(db, office, target))
+            print(f"{days:>5}日 {total:>10,} {size / 1024 / 1024:>8.1f}MB {dates_ms:>8.2f}ms {new_ms:>9.2f}ms {old_ms:>9.2f}ms {pop_ms:>8.2f}ms")
+
+        print("クエリプラン:", " / ".join(row[-1] for row in plan))
+        db.close()
+
+if __name__ == "__main__":
+    main()
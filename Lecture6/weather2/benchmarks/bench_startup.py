@@ -0,0 +1,55 @@
+"""ネットワークなしでの起動時間 (地域データの表示まで) を測る
+
+    python benchmarks/bench_startup.py
+
+HTTPキャッシュに area.json のスナップショットがある状態で AreaStore.load_snapshot を計測し、
+area_store.STARTUP_BUDGET_MS を超えたら終了コード 1 を返す。
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import requests
+
+from area_store import AREA_URL, STARTUP_BUDGET_MS, AreaStore
+from fixtures import make_area_json
+from http_cache import HttpCache
+
+class _NoNetwork:
+    """起動経路で通信していないことを確かめるため、requests の送信を失敗させる"""
+
+    def __enter__(self):
+        self._send = requests.Session.send
+        def send(*args, **kwargs):
+            raise AssertionError("起動時にネットワークへアクセスしました")
+        requests.Session.send = send
+
+    def __exit__(self, *exc):
+        requests.Session.send = self._send
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = HttpCache(os.path.join(tmp, "http_cache"))
+        body = json.dumps(make_area_json(), ensure_ascii=False).encode("utf-8")
+        # 前回起動時に保存されたのと同じ形でスナップショットを置く
+        cache._write_atomic(cache._path(AREA_URL, "json"), body)
+        print(f"スナップショット: {len(body) / 1024:.0f} KiB")
+
+        timings = []
+        with _NoNetwork():
+            for _ in range(5):
+                start = time.perf_counter()
+                store = AreaStore(cache)
+                assert store.load_snapshot() is not None
+                timings.append((time.perf_counter() - start) * 1000)
+
+    best, worst = min(timings), max(timings)
+    print(f"地域データの読み込み: 最短 {best:.1f}ms / 最長 {worst:.1f}ms (目標 {STARTUP_BUDGET_MS}ms)")
+    return 0 if worst <= STARTUP_BUDGET_MS else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
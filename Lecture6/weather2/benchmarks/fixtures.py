@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta
+
+# --- ベンチマーク用の合成データ ---
+# 気象庁の forecast/{code}.json と同じ構造の予報JSONを生成する。
+# ネットワークに依存せずに同じ大きさの入力を再現するためのもの。
+
+WEATHER_SAMPLES = [
+    ("100", "晴れ"), ("101", "晴れ　時々　くもり"), ("200", "くもり"),
+    ("201", "くもり　時々　晴れ"), ("300", "雨"), ("400", "雪"),
+]
+
+def make_forecast(office="130000", n_areas=4, report="2026-01-07T11:00:00+09:00", days=3, seed=0):
+    """短期予報 + 週間予報の2要素リストを返す
+
+    n_areas, days を大きくすると、実際より大きな複数地域のペイロードになる。
+    """
+    rnd = random.Random(seed)
+    report_dt = datetime.fromisoformat(report)
+    base = report_dt.replace(hour=0, minute=0, second=0)
+
+    short_times = [(base + timedelta(days=d)).replace(hour=report_dt.hour if d == 0 else 0) for d in range(days)]
+    pop_times = [base + timedelta(hours=h) for h in range(12, 24 * days, 6)]
+    temp_times = [base + timedelta(days=d, hours=h) for d in range(days) for h in (0, 9)]
+
+    areas = [{"area": {"name": f"地域{i}", "code": f"{office[:3]}{i:03d}"}} for i in range(n_areas)]
+
+    def weather():
+        return rnd.choice(WEATHER_SAMPLES)
+
+    short_weather = []
+    for a in areas:
+        picks = [weather() for _ in short_times]
+        short_weather.append(dict(
+            a,
+            weatherCodes=[c for c, _ in picks],
+            weathers=[t for _, t in picks],
+            winds=["北の風　後　北西の風"] * len(short_times),
+            waves=["１メートル"] * len(short_times),
+        ))
+    short = {
+        "publishingOffice": "気象庁",
+        "reportDatetime": report,
+        "timeSeries": [
+            {"timeDefines": [t.isoformat() for t in short_times], "areas": short_weather},
+            {"timeDefines": [t.isoformat() for t in pop_times],
+             "areas": [dict(a, pops=[str(rnd.randrange(0, 101, 10)) for _ in pop_times]) for a in areas]},
+            {"timeDefines": [t.isoformat() for t in temp_times],
+             "areas": [dict(a, temps=[str(rnd.randint(-5, 30)) for _ in temp_times]) for a in areas]},
+        ],
+    }
+
+    week_times = [base + timedelta(days=d) for d in range(1, 8)]
+    week_areas = [{
+        "area": {"name": f"{office}地方", "code": f"{office[:3]}010"},
+        "weatherCodes": [weather()[0] for _ in week_times],
+        "pops": [""] + [str(rnd.randrange(0, 101, 10)) for _ in week_times[1:]],
+        "reliabilities": [""] * len(week_times),
+    }]
+    week_temps = [{
+        "area": {"name": "代表地点", "code": "44132"},
+        "tempsMin": [""] + [str(rnd.randint(-5, 20)) for _ in week_times[1:]],
+        "tempsMax": [""] + [str(rnd.randint(5, 35)) for _ in week_times[1:]],
+    }]
+    week = {
+        "publishingOffice": "気象庁",
+        "reportDatetime": report,
+        "timeSeries": [
+            {"timeDefines": [t.isoformat() for t in week_times], "areas": week_areas},
+            {"timeDefines": [t.isoformat() for t in week_times], "areas": week_temps},
+        ],
+    }
+    return [short, week]
+
+def make_area_json(n_centers=11, offices_per_center=5, class10_per_office=4, class20_per_class10=10):
+    """area.json と同じ構造 (centers / offices / class10s / class15s / class20s) の地域データ
+
+    既定値で本物とほぼ同じ件数 (class20 が約2,000件) になる。
+    """
+    centers, offices, class10s, class15s, class20s = {}, {}, {}, {}, {}
+    for c in range(n_centers):
+        center_code = f"01{c:02d}00"
+        centers[center_code] = {"name": f"地方{c}", "enName": f"Region {c}", "officeName": f"気象台{c}", "children": []}
+        for o in range(offices_per_center):
+            office_code = f"{c * offices_per_center + o + 1:02d}0000"
+            centers[center_code]["children"].append(office_code)
+            offices[office_code] = {"name": f"県{office_code[:2]}", "enName": f"Pref {office_code[:2]}",
+                                    "officeName": f"気象台{office_code[:2]}", "parent": center_code, "children": []}
+            for k in range(class10_per_office):
+                c10 = f"{office_code[:2]}{k + 1:02d}10"
+                offices[office_code]["children"].append(c10)
+                class10s[c10] = {"name": f"{office_code[:2]}地方{k}", "enName": f"Area {c10}", "parent": office_code, "children": []}
+                c15 = f"{office_code[:2]}{k + 1:02d}11"
+                class10s[c10]["children"].append(c15)
+                class15s[c15] = {"name": f"{office_code[:2]}地域{k}", "enName": f"Area {c15}", "parent": c10, "children": []}
+                for m in range(class20_per_class10):
+                    c20 = f"{office_code[:2]}{k + 1:02d}{m:03d}00"
+                    class15s[c15]["children"].append(c20)
+                    class20s[c20] = {"name": f"市{c20}", "enName": f"City {c20}", "kana": f"し{c20}", "parent": c15}
+    return {"centers": centers, "offices": offices, "class10s": class10s, "class15s": class15s, "class20s": class20s}
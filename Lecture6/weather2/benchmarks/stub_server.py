@@ -0,0 +1,195 @@
+"""気象庁API のスタブサーバー (負荷試験用)
+
+    python benchmarks/stub_server.py [--port 8765] [--latency-ms 50] [--error-rate 0.05] [--fixtures DIR]
+    python benchmarks/stub_server.py --record DIR     # 本物の area.json / 予報JSON を DIR に保存する
+
+area.json と forecast/{code}.json を返す。--fixtures を指定すると保存済みのJSON
+(DIR/area.json, DIR/forecast/{code}.json) を、指定しなければ fixtures.py の合成データを返す。
+ETag 付きで返し、If-None-Match が一致すれば 304 を返す。
+jma_client.py の --area-url / --forecast-url にこのサーバーを指定すれば本番と同じ経路で試せる。
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from fixtures import make_area_json, make_forecast
+
+AREA_PATH = "/bosai/common/const/area.json"
+FORECAST_PREFIX = "/bosai/forecast/data/forecast/"
+
+class StubJMA:
+    """latency_ms (± jitter_ms) だけ待ってから返し、error_rate の割合で 503 を返す"""
+
+    def __init__(self, fixtures_dir=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 report="2026-01-07T11:00:00+09:00", n_areas=4, seed=0, port=0):
+        self.fixtures_dir = fixtures_dir
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.report = report
+        self.n_areas = n_areas
+        self.port = port
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+        if fixtures_dir:
+            with open(os.path.join(fixtures_dir, "area.json"), encoding="utf-8") as f:
+                self.area_json = json.load(f)
+        else:
+            self.area_json = make_area_json()
+
+    # --- URL ---
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @property
+    def area_url(self):
+        return self.base_url + AREA_PATH
+
+    @property
+    def forecast_url(self):
+        return self.base_url + FORECAST_PREFIX + "{}.json"
+
+    # --- 応答内容 ---
+    def publish(self, report):
+        """合成データの reportDatetime を進める (次の発表が出た状態にする)"""
+        with self._lock:
+            self.report = report
+            self._bodies.clear()
+
+    def _forecast_body(self, code):
+        if self.fixtures_dir:
+            path = os.path.join(self.fixtures_dir, "forecast", f"{code}.json")
+            if not os.path.exists(path):
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        if code not in self.area_json["offices"]:
+            return None
+        return json.dumps(make_forecast(code, n_areas=self.n_areas, report=self.report,
+                                        seed=int(code[:2])), ensure_ascii=False).encode("utf-8")
+
+    def body(self, path):
+        """パスに対応するJSONの本文 (なければ None)。一度作ったものは使い回す"""
+        with self._lock:
+            if path in self._bodies:
+                return self._bodies[path]
+        if path == AREA_PATH:
+            body = json.dumps(self.area_json, ensure_ascii=False).encode("utf-8")
+        elif path.startswith(FORECAST_PREFIX) and path.endswith(".json"):
+            body = self._forecast_body(path[len(FORECAST_PREFIX):-len(".json")])
+        else:
+            body = None
+        with self._lock:
+            self._bodies[path] = body
+        return body
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self._random.random() < self.error_rate
+        return max(0.0, self.latency_ms + jitter) / 1000, fail
+
+    # --- サーバー ---
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body=b"", headers=()):
+                with stub._lock:
+                    stub.counts[status] += 1
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                wait, fail = stub.delay()
+                time.sleep(wait)
+                if fail:
+                    return self.reply(503)
+                body = stub.body(self.path)
+                if body is None:
+                    return self.reply(404)
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    return self.reply(304, headers=[("ETag", etag)])
+                self.reply(200, body, [("ETag", etag), ("Content-Type", "application/json")])
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="stub-jma").start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def record(fixtures_dir):
+    """本物の気象庁APIから area.json と全オフィスの予報JSONを保存する"""
+    import requests
+
+    from jma_client import AREA_URL, FORECAST_URL
+
+    os.makedirs(os.path.join(fixtures_dir, "forecast"), exist_ok=True)
+    res = requests.get(AREA_URL, timeout=30)
+    res.raise_for_status()
+    with open(os.path.join(fixtures_dir, "area.json"), "wb") as f:
+        f.write(res.content)
+    for code in res.json()["offices"]:
+        r = requests.get(FORECAST_URL.format(code), timeout=30)
+        if r.ok:
+            with open(os.path.join(fixtures_dir, "forecast", f"{code}.json"), "wb") as f:
+                f.write(r.content)
+        print(f"{code}: {r.status_code}", file=sys.stderr)
+        time.sleep(0.2)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="気象庁API のスタブサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="保存済みのJSONを返す (なければ合成データ)")
+    parser.add_argument("--record", metavar="DIR", help="本物のJSONを DIR に保存して終了する")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record)
+        return 0
+
+    stub = StubJMA(args.fixtures, args.latency_ms, args.jitter_ms, args.error_rate, port=args.port).start()
+    print(f"--area-url {stub.area_url} --forecast-url {stub.forecast_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
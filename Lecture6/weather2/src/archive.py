@@ -0,0 +1,204 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+from ingest import FORECAST_COLUMNS
+
+# --- 予報の履歴アーカイブ ---
+# forecasts は表示用に「各地域・日付の最新の発表」を持つ。予報がどう変わったか・当たったかを
+# 後から見られるよう、取り込んだ行はすべて発表月ごとのテーブル forecast_archive_YYYYMM にも追記する。
+#   - 同じ発表の同じ内容 (再取得) は digest が一致するので INSERT OR IGNORE で1行にまとまる
+#   - 同じ発表の内容が後から変わった (訂正) ときは別のスナップショットとして残る
+#   - 圧縮 (compact) では発表ごとに最後のスナップショットだけを残し、
+#     保存期間を過ぎた月はテーブルごと DROP する (行を1件ずつ消すより速く、断片化もしない)
+
+ARCHIVE_PREFIX = "forecast_archive_"
+# 表示用 forecasts と同じ列 + 内容のハッシュ + 最初に取り込んだ時刻
+ARCHIVE_COLUMNS = FORECAST_COLUMNS + ("digest", "fetched_at")
+# 内容の比較に使う列 (キー = area_code, target_date, data_source, report_datetime 以外)
+_DIGEST_INDEXES = tuple(i for i, c in enumerate(FORECAST_COLUMNS)
+                        if c not in ("area_code", "target_date", "data_source", "report_datetime"))
+# 週間予報はおよそ7日先までなので、target_date の何日前からの発表を探せば足りるか
+ARCHIVE_LOOKBACK_DAYS = 10
+# 何か月分のアーカイブを残すか (None なら消さない)
+ARCHIVE_RETENTION_MONTHS = 24
+_PARTITION_RE = re.compile(rf"^{ARCHIVE_PREFIX}(\d{{6}})$")
+
+def partition_month(report_datetime):
+    """'2026-01-05T05:00:00+09:00' -> '202601' (発表時刻の月)"""
+    return report_datetime[:4] + report_datetime[5:7]
+
+def partition_table(month):
+    if not re.fullmatch(r"\d{6}", month):
+        raise ValueError(f"月の形式が違います: {month}")
+    return ARCHIVE_PREFIX + month
+
+def shift_month(month, months):
+    """'202601' を months か月ずらす"""
+    n = int(month[:4]) * 12 + int(month[4:]) - 1 + months
+    return f"{n // 12:04d}{n % 12 + 1:02d}"
+
+def snapshot_digest(row):
+    """行の内容 (キー以外) の64bitハッシュ。同じ内容の再取得を見分けるのに使う"""
+    text = "\x1f".join("" if row[i] is None else str(row[i]) for i in _DIGEST_INDEXES)
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+def create_partition(cur, month):
+    # 主キーの先頭を (parent_code, target_date) にして、get_forecast_as_of を主キーだけで引く
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {partition_table(month)} (
+            parent_code TEXT,
+            area_code TEXT,
+            area_name TEXT,
+            target_date TEXT,
+            weather_code TEXT,
+            weather_text TEXT,
+            wind_text TEXT,
+            wave_text TEXT,
+            temps TEXT,
+            pops TEXT,
+            report_datetime TEXT,
+            data_source TEXT,
+            min_temp INTEGER,
+            max_temp INTEGER,
+            digest INTEGER NOT NULL,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (parent_code, target_date, area_code, data_source, report_datetime, digest)
+        ) WITHOUT ROWID
+    """)
+
+def list_partitions(cur):
+    """保存済みの月 ['202601', ...] (古い順)"""
+    rows = cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+                       (ARCHIVE_PREFIX + "%",)).fetchall()
+    return sorted(m.group(1) for (name,) in rows if (m := _PARTITION_RE.match(name)))
+
+def append_snapshots(cur, forecasts, fetched_at, known=None):
+    """forecasts の行を発表月のテーブルに追記する。(新しく増えたスナップショットの数, 新しく作った月の集合) を返す
+
+    known は作成済みの月の集合 (毎回 CREATE TABLE IF NOT EXISTS を投げないため)。ここでは書き換えない
+    (作ったテーブルは rollback で消えることがあるので、呼び出し側がコミットしてから加える)。
+    """
+    known = set(list_partitions(cur)) if known is None else known
+    by_month = {}
+    for row in forecasts:
+        by_month.setdefault(partition_month(row[10]), []).append(row + (snapshot_digest(row), fetched_at))
+
+    added, created = 0, set()
+    for month, rows in by_month.items():
+        if month not in known:
+            create_partition(cur, month)
+            created.add(month)
+        before = cur.connection.total_changes
+        cur.executemany(
+            f"INSERT OR IGNORE INTO {partition_table(month)} ({', '.join(ARCHIVE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(ARCHIVE_COLUMNS))})",
+            rows,
+        )
+        added += cur.connection.total_changes - before
+    return added, created
+
+class ForecastArchive:
+    """発表月ごとのアーカイブテーブルへの追記・過去時点の参照・圧縮"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        with pool.reader() as conn:
+            self._known = set(list_partitions(conn.cursor()))
+
+    def append(self, conn, forecasts, fetched_at):
+        """書き込み中の接続 conn (forecasts と同じトランザクション) で追記する
+
+        (追記したスナップショットの数, 新しく作った月) を返す。作った月はコミットしてから remember に渡す。
+        """
+        with self._lock:
+            return append_snapshots(conn.cursor(), forecasts, fetched_at, self._known)
+
+    def remember(self, months):
+        """コミット済みのトランザクションで作った月を作成済みとして覚える"""
+        with self._lock:
+            self._known.update(months)
+
+    def _candidate_months(self, conn, target_date, until):
+        """target_date の予報を含みうる月 (target_date の少し前 〜 until の月) のうち保存済みのもの"""
+        first = (date.fromisoformat(target_date) - timedelta(days=ARCHIVE_LOOKBACK_DAYS)).strftime("%Y%m")
+        last = partition_month(until) if until else "999912"
+        return [m for m in list_partitions(conn.cursor()) if first <= m <= last]
+
+    def _union(self, conn, target_date, until, sql_for):
+        """候補の月ごとの SELECT を UNION ALL でつないだ SQL と月の数 (候補がなければ None)"""
+        months = self._candidate_months(conn, target_date, until)
+        if not months:
+            return None
+        return " UNION ALL ".join(sql_for(partition_table(m)) for m in months), len(months)
+
+    def as_of(self, parent_code, target_date, until):
+        """until (reportDatetime と同じ形式の文字列) の時点で見えていた target_date の予報 (地名ごとに1行)
+
+        表示用と同じく 'short' を優先し、同じ種類なら新しい発表、同じ発表なら最後のスナップショットを選ぶ。
+        """
+        with self.pool.reader() as conn:
+            selected = self._union(conn, target_date, until, lambda t: (
+                f"SELECT * FROM {t} WHERE parent_code = ? AND target_date = ? AND report_datetime <= ?"))
+            if not selected:
+                return []
+            union, n = selected
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute(f"""
+                SELECT {', '.join(ARCHIVE_COLUMNS)} FROM (
+                    SELECT *, ROW_NUMBER() OVER (
+                        PARTITION BY area_name
+                        ORDER BY data_source = 'short' DESC, report_datetime DESC, fetched_at DESC
+                    ) AS rank
+                    FROM ({union})
+                )
+                WHERE rank = 1
+                ORDER BY area_code
+            """, (parent_code, target_date, until) * n)
+            return cur.fetchall()
+
+    def reports(self, parent_code, target_date):
+        """target_date の予報を含む発表時刻の一覧 (古い順)。予報の移り変わりを追うときに使う"""
+        with self.pool.reader() as conn:
+            selected = self._union(conn, target_date, None, lambda t: (
+                f"SELECT report_datetime FROM {t} WHERE parent_code = ? AND target_date = ?"))
+            if not selected:
+                return []
+            union, n = selected
+            cur = conn.execute(f"SELECT DISTINCT report_datetime FROM ({union}) ORDER BY report_datetime",
+                               (parent_code, target_date) * n)
+            return [row[0] for row in cur.fetchall()]
+
+    def compact(self, conn, now, retention_months=ARCHIVE_RETENTION_MONTHS):
+        """発表ごとに最後のスナップショットだけを残し、保存期間を過ぎた月を消す
+
+        (消したスナップショット数, 消した月の一覧) を返す。conn は書き込み用の接続。
+        """
+        cutoff = shift_month(now.strftime("%Y%m"), -retention_months) if retention_months is not None else None
+        removed, dropped = 0, []
+        with self._lock:
+            for month in list_partitions(conn.cursor()):
+                table = partition_table(month)
+                if cutoff is not None and month < cutoff:
+                    conn.execute(f"DROP TABLE {table}")
+                    self._known.discard(month)
+                    dropped.append(month)
+                    continue
+                # 同じ発表のスナップショットが複数ある (訂正があった) ときは最後のもの以外を消す
+                cur = conn.execute(f"""
+                    DELETE FROM {table} WHERE EXISTS (
+                        SELECT 1 FROM {table} AS newer
+                        WHERE newer.parent_code = {table}.parent_code
+                          AND newer.target_date = {table}.target_date
+                          AND newer.area_code = {table}.area_code
+                          AND newer.data_source = {table}.data_source
+                          AND newer.report_datetime = {table}.report_datetime
+                          AND newer.fetched_at > {table}.fetched_at
+                    )
+                """)
+                removed += cur.rowcount
+        return removed, dropped
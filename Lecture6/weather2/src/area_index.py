@@ -0,0 +1,255 @@
+import json
+import os
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+# --- 地域の階層索引 ---
+# area.json の centers → offices → class10s → class15s → class20s を1回だけ木にして持つ。
+# 地域はコード・地名・よみ・階層・親の番号の並列の配列に持ち、AreaNode は必要なときだけ作るビューにする。
+# 地名とよみ (かな) は最初の検索で正規化して並べ、前方一致の検索を二分探索で行う。
+# 地域コードは階層をまたいで重なることがある (地方と府県予報区など) ので親は (階層, コード) で引く。
+# 索引はJSONに保存でき、次回起動時は area.json を読み直さずに復元できる。
+
+# (area.json のキー, 階層名) 。上の階層から順に並べる
+AREA_LEVELS = (
+    ("centers", "center"),
+    ("offices", "office"),
+    ("class10s", "class10"),
+    ("class15s", "class15"),
+    ("class20s", "class20"),
+)
+LEVEL_NAMES = tuple(level for _, level in AREA_LEVELS)
+# 画面に出す階層の呼び方
+LEVEL_LABELS = {
+    "center": "地方",
+    "office": "府県予報区",
+    "class10": "一次細分区域",
+    "class15": "市町村等をまとめた地域",
+    "class20": "市町村",
+}
+INDEX_FORMAT_VERSION = 1
+# 1回の検索で集める候補の上限 (1文字だけの入力で全件を並べ替えないように)
+SEARCH_SCAN_LIMIT = 200
+
+def normalize(text):
+    """検索用に正規化する (全角半角の統一・カタカナをひらがなに・小文字化)"""
+    text = unicodedata.normalize("NFKC", text or "").strip().lower()
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+
+class PackedStrings:
+    """文字列の並びを1つの文字列と区切り位置の配列で持つ (1件ごとの str オブジェクトを作らない)
+
+    None は空文字列として入れ、取り出すときに None に戻す。
+    """
+    __slots__ = ("_parts", "_text", "_ends")
+
+    def __init__(self):
+        self._parts = []
+        self._text = ""
+        self._ends = array("i")
+
+    def append(self, text):
+        self._parts.append(text or "")
+        self._ends.append((self._ends[-1] if self._ends else 0) + len(text or ""))
+
+    def pack(self):
+        """append し終えたら1つの文字列にまとめる"""
+        self._text += "".join(self._parts)
+        self._parts = []
+
+    def __len__(self):
+        return len(self._ends)
+
+    def __getitem__(self, i):
+        start = self._ends[i - 1] if i > 0 else 0
+        return self._text[start:self._ends[i]] or None
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+class AreaNode:
+    """AreaIndex の1件を指す軽いビュー (中身は AreaIndex の配列にあり、必要なときだけ作る)"""
+    __slots__ = ("index", "i")
+
+    def __init__(self, index, i):
+        self.index = index
+        self.i = i
+
+    @property
+    def code(self):
+        return self.index.codes[self.i]
+
+    @property
+    def name(self):
+        return self.index.names[self.i]
+
+    @property
+    def kana(self):
+        return self.index.kanas[self.i]
+
+    @property
+    def level(self):
+        return self.index.levels[self.i]
+
+    @property
+    def level_name(self):
+        return LEVEL_NAMES[self.level]
+
+    @property
+    def parent(self):
+        parent = self.index.parents[self.i]
+        return AreaNode(self.index, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        return [AreaNode(self.index, j) for j in self.index.children_of(self.i)]
+
+    def __eq__(self, other):
+        return isinstance(other, AreaNode) and self.index is other.index and self.i == other.i
+
+    def __hash__(self):
+        return hash((id(self.index), self.i))
+
+    def __repr__(self):
+        return f"AreaNode({self.code!r}, {self.name!r}, {self.level_name})"
+
+class AreaIndex:
+    __slots__ = ("codes", "names", "kanas", "levels", "parents", "_child_ends", "_children", "_keys", "_key_nodes")
+
+    def __init__(self, rows):
+        """rows は (code, name, kana, 階層番号, 親コード) の並び (上の階層から順)"""
+        # 地域ごとのオブジェクトは作らず、番号 (i) で引く並列の配列に持つ。
+        # parents は1つ上の階層の番号 (最上位・親が見つからなければ -1)
+        self.codes, self.names, self.kanas = PackedStrings(), PackedStrings(), PackedStrings()
+        self.levels = array("b")
+        self.parents = array("i")
+        # (階層番号, コード) -> 番号 。親を引くために作るときだけ使う
+        numbers = {}
+        for code, name, kana, level, parent in rows:
+            numbers[(level, code)] = len(self.codes)
+            self.codes.append(code)
+            self.names.append(name)
+            self.kanas.append(kana)
+            self.levels.append(level)
+            self.parents.append(numbers.get((level - 1, parent), -1))
+        for column in (self.codes, self.names, self.kanas):
+            column.pack()
+        self._index_children()
+        # 検索キーは最初の検索で作る
+        self._keys = None
+        self._key_nodes = None
+
+    @classmethod
+    def from_items(cls, items):
+        """(階層番号, コード, area.json の要素) の並びから作る"""
+        return cls((code, info["name"], info.get("kana"), level, info.get("parent")) for level, code, info in items)
+
+    @classmethod
+    def from_area_json(cls, area_json):
+        return cls.from_items(
+            (level, code, info)
+            for level, (key, _) in enumerate(AREA_LEVELS)
+            for code, info in area_json.get(key, {}).items()
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    # --- 階層 ---
+    def level(self, name):
+        """階層名 ("center", "office", ...) の地域を area.json の順に返す"""
+        level = LEVEL_NAMES.index(name)
+        return [AreaNode(self, i) for i, l in enumerate(self.levels) if l == level]
+
+    def centers(self):
+        return self.level("center")
+
+    def offices(self):
+        return self.level("office")
+
+    def _index_children(self):
+        # 子の番号を親ごとにまとめて1つの配列に並べ、親 i の子は _children[_child_ends[i - 1]:_child_ends[i]] にする
+        counts = array("i", bytes(4 * len(self.parents)))
+        for parent in self.parents:
+            if parent >= 0:
+                counts[parent] += 1
+        ends, total = array("i"), 0
+        for count in counts:
+            total += count
+            ends.append(total)
+        children = array("i", bytes(4 * total))
+        filled = array("i", (end - count for end, count in zip(ends, counts)))
+        for j, parent in enumerate(self.parents):
+            if parent >= 0:
+                children[filled[parent]] = j
+                filled[parent] += 1
+        self._child_ends, self._children = ends, children
+
+    def children_of(self, i):
+        """番号 i の地域の子の番号 (area.json の順)"""
+        start = self._child_ends[i - 1] if i > 0 else 0
+        return self._children[start:self._child_ends[i]].tolist()
+
+    def office_of(self, node):
+        """地域を含む府県予報区 (office) の AreaNode 。center なら None"""
+        if node is None:
+            return None
+        office_level = LEVEL_NAMES.index("office")
+        i = node.i
+        while i >= 0 and self.levels[i] > office_level:
+            i = self.parents[i]
+        return AreaNode(self, i) if i >= 0 and self.levels[i] == office_level else None
+
+    # --- 検索 ---
+    def _build_keys(self):
+        # 正規化した地名・よみを並べ、キーも PackedStrings に詰める (bisect は添字で引けるものなら使える)
+        entries = []
+        for i, (name, kana) in enumerate(zip(self.names, self.kanas)):
+            for text in (name, kana) if kana else (name,):
+                key = normalize(text)
+                if key:
+                    entries.append((key, i))
+        entries.sort()
+        keys = PackedStrings()
+        for key, _ in entries:
+            keys.append(key)
+        keys.pack()
+        self._keys = keys
+        self._key_nodes = array("i", (i for _, i in entries))
+
+    def search(self, query, limit=20):
+        """地名・よみの前方一致。上の階層 (広い地域) ほど先に、同じ階層なら名前の短い順に返す"""
+        key = normalize(query)
+        if not key:
+            return []
+        if self._keys is None:
+            self._build_keys()
+        found = {}
+        i = bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key) and len(found) < SEARCH_SCAN_LIMIT:
+            found.setdefault(self._key_nodes[i], None)
+            i += 1
+        numbers = sorted(found, key=lambda j: (self.levels[j], len(self.names[j]), self.codes[j]))
+        return [AreaNode(self, j) for j in numbers[:limit]]
+
+    # --- 保存・復元 ---
+    def to_rows(self):
+        return [[code, name, kana, level, self.codes[parent] if parent >= 0 else None]
+                for code, name, kana, level, parent in zip(self.codes, self.names, self.kanas, self.levels, self.parents)]
+
+    def save(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_FORMAT_VERSION, "rows": self.to_rows()}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """保存した索引を読み込む (形式が違えば ValueError)"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"索引の形式が違います: {data.get('version')}")
+        return cls(data["rows"])
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import ijson
+except ImportError:
+    # ijson がなければ json で全体を読んでから索引にする (結果は同じ)
+    ijson = None
+
+from area_index import AREA_LEVELS, AreaIndex
+
+# --- 地域データ (area.json) の読み込み ---
+# 起動時はネットワークを待たず、ローカルのスナップショットから即座に読み込む。
+#   1. 前回作った地域の索引 (area_index.json)
+#   2. HTTPキャッシュに保存済みの area.json (前回起動時に取得したもの)
+# どちらもない初回起動時は、ネットワークから取得できるまで地域を選べない。
+# 最新版の取得はバックグラウンドで行い、取れたら登録済みのコールバックに通知する。
+# 読み込んだ area.json は AreaIndex (地名・よみ・親子関係だけの木) にして保持する。
+
+AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
+# HTTPキャッシュのディレクトリに保存する索引のファイル名
+AREA_INDEX_FILE = "area_index.json"
+
+# ネットワークなしで地域データを表示できるまでの目標時間
+STARTUP_BUDGET_MS = 200
+REFRESH_RETRIES = 3
+REFRESH_BACKOFF = 2.0
+# セッションが増えるたびに取り直さないよう、更新は最低この間隔 (秒) を空ける
+REFRESH_INTERVAL = 3600
+
+AREA_PARSE_ERRORS = (ValueError, KeyError, TypeError) + ((ijson.JSONError,) if ijson else ())
+
+def load_area_index(fp):
+    """area.json のファイル (バイナリ) から AreaIndex を作る
+
+    ijson があれば階層ごとに1件ずつ逐次読み、area.json 全体を辞書にしない。
+    """
+    if ijson is None:
+        return AreaIndex.from_area_json(json.load(fp))
+
+    def items():
+        for level, (key, _) in enumerate(AREA_LEVELS):
+            fp.seek(0)
+            for code, info in ijson.kvitems(fp, key):
+                yield level, code, info
+
+    index = AreaIndex.from_items(items())
+    if not index.centers():
+        raise ValueError("area.json に centers がありません")
+    return index
+
+class AreaStore:
+    def __init__(self, cache, url=AREA_URL):
+        self.cache = cache
+        self.url = url
+        self.index_path = os.path.join(cache.cache_dir, AREA_INDEX_FILE)
+        self.data = None
+        self.source = None
+        self.load_ms = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._refreshed_at = None
+
+    def load_snapshot(self):
+        """ローカルのスナップショットを読み込む (ネットワークには行かない)"""
+        start = time.perf_counter()
+        data = None
+        if self._index_is_fresh():
+            try:
+                data, source = AreaIndex.load(self.index_path), "index"
+            except (OSError,) + AREA_PARSE_ERRORS as e:
+                print(f"⚠️ 地域の索引を読み込めません: {e}")
+        if data is None:
+            fp = self.cache.open(self.url)
+            if fp is not None:
+                with fp:
+                    try:
+                        data, source = load_area_index(fp), "cache"
+                    except AREA_PARSE_ERRORS as e:
+                        print(f"⚠️ 地域データ (cache) を読み込めません: {e}")
+                if data is not None:
+                    self._save_index(data)
+        self.load_ms = (time.perf_counter() - start) * 1000
+        if data is not None:
+            self.data, self.source = data, source
+        status = "⏱️" if self.load_ms <= STARTUP_BUDGET_MS else "🐢"
+        print(f"{status} 地域データ: {self.source or 'なし'} から {self.load_ms:.1f}ms (目標 {STARTUP_BUDGET_MS}ms)")
+        return self.data
+
+    def _index_is_fresh(self):
+        """保存した索引が HTTPキャッシュの area.json より新しいか"""
+        if not os.path.exists(self.index_path):
+            return False
+        body_mtime = self.cache.body_mtime(self.url)
+        return body_mtime is None or os.path.getmtime(self.index_path) >= body_mtime
+
+    def _save_index(self, index):
+        try:
+            index.save(self.index_path)
+        except OSError as e:
+            print(f"⚠️ 地域の索引を保存できません: {e}")
+
+    def add_listener(self, callback):
+        """新しい地域データが届いたときに callback(data) を呼ぶ (取得できなければ None)"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def refresh_async(self):
+        """最新の area.json をバックグラウンドで取得する (実行中・取得直後なら何もしない)"""
+        with self._lock:
+            recent = self._refreshed_at is not None and time.monotonic() - self._refreshed_at < REFRESH_INTERVAL
+            if self._refreshing or recent:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, daemon=True, name="area-refresh").start()
+
+    def _refresh(self):
+        try:
+            for attempt in range(REFRESH_RETRIES + 1):
+                try:
+                    # 本文はキャッシュに保存だけして、必要な部分を逐次読む
+                    _, not_modified = self.cache.get(self.url, timeout=10, decode=False)
+                    if not_modified and self.data is not None and self._index_is_fresh():
+                        self._refreshed_at = time.monotonic()
+                        return
+                    fp = self.cache.open(self.url)
+                    if fp is None:
+                        raise OSError("保存した地域データが見つかりません")
+                    with fp:
+                        data = load_area_index(fp)
+                    self._save_index(data)
+                    self._refreshed_at = time.monotonic()
+                    break
+                except Exception as e:
+                    print(f"⚠️ 地域データの更新に失敗 ({attempt + 1}/{REFRESH_RETRIES + 1}): {e}")
+                    if attempt >= REFRESH_RETRIES:
+                        # 表示できるデータが1つもなければ None で失敗を知らせる
+                        if self.data is None:
+                            self._notify(None)
+                        return
+                    time.sleep(REFRESH_BACKOFF * (2 ** attempt))
+
+            self.data, self.source = data, "network"
+            self._notify(data)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _notify(self, data):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(data)
+            except Exception as e:
+                print(f"⚠️ 地域データの通知に失敗: {e}")
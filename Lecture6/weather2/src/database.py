@@ -0,0 +1,505 @@
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import tracing
+from archive import ARCHIVE_RETENTION_MONTHS, ForecastArchive
+from ingest import (FORECAST_COLUMNS, FORECAST_POP_COLUMNS, FORECAST_TEMP_COLUMNS,
+                    ForecastBatch, IngestStats, build_forecast_rows)
+from publication import JST, is_report_fresh
+
+# --- 定数 ---
+# スキーマのバージョンは SQLite の PRAGMA user_version に保存する
+SCHEMA_VERSION = 4
+
+# 接続ごとに設定する PRAGMA
+# WAL なら読み込みと書き込みが互いをブロックしないので synchronous=NORMAL で十分
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",       # 約8MB (負の値はKiB単位)
+    "PRAGMA mmap_size = 67108864",     # 64MB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+READER_POOL_SIZE = 4
+# 圧縮で forecasts (表示用) に残す過去の日付の日数。それより前はアーカイブから引く
+LIVE_RETENTION_DAYS = 31
+
+# 同じ地名 (area_name) の中から 'short' を優先し、同じ種類なら新しい発表を1行だけ選ぶ
+SELECT_FORECASTS_BY_DATE_SQL = f"""
+    SELECT {', '.join(FORECAST_COLUMNS)} FROM (
+        SELECT *, ROW_NUMBER() OVER (
+            PARTITION BY area_name
+            ORDER BY data_source = 'short' DESC, report_datetime DESC
+        ) AS rank
+        FROM forecasts
+        WHERE parent_code = ? AND target_date = ?
+    )
+    WHERE rank = 1
+    ORDER BY area_code
+"""
+
+def _insert_sql(table, columns):
+    return f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+INSERT_FORECAST_SQL = _insert_sql("forecasts", FORECAST_COLUMNS)
+INSERT_FORECAST_TEMP_SQL = _insert_sql("forecast_temps", FORECAST_TEMP_COLUMNS)
+INSERT_FORECAST_POP_SQL = _insert_sql("forecast_pops", FORECAST_POP_COLUMNS)
+
+# 各地域の最新の発表だけを対象に、降水確率が閾値以上の時間帯を探す
+# (forecast_pops の (target_date, pop) 索引で絞り込み、最新かどうかは forecasts の主キーで確認する)
+SELECT_AREAS_BY_POP_SQL = """
+    SELECT f.parent_code, f.area_code, f.area_name, f.data_source, f.report_datetime,
+           p.hour, p.pop
+    FROM forecast_pops p
+    JOIN forecasts f USING (area_code, target_date, data_source, report_datetime)
+    WHERE p.target_date = ? AND p.pop >= ?
+      AND p.report_datetime = (
+          SELECT MAX(l.report_datetime) FROM forecasts l
+          WHERE l.area_code = p.area_code AND l.target_date = p.target_date AND l.data_source = p.data_source
+      )
+    ORDER BY p.pop DESC, f.parent_code, f.area_code, p.hour
+"""
+
+# 同じ地域・日付・種類でより新しい発表がある行 (履歴はアーカイブにあるので表示用からは消してよい)
+DELETE_SUPERSEDED_FORECASTS_SQL = """
+    DELETE FROM forecasts WHERE EXISTS (
+        SELECT 1 FROM forecasts AS newer
+        WHERE newer.area_code = forecasts.area_code
+          AND newer.target_date = forecasts.target_date
+          AND newer.data_source = forecasts.data_source
+          AND newer.report_datetime > forecasts.report_datetime
+    )
+"""
+
+def to_report_datetime(value):
+    """datetime か ISO形式の文字列を、保存している reportDatetime (JST) と比較できる文字列にする"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        raise ValueError("タイムゾーンのない日時は比較できません")
+    return value.astimezone(JST).isoformat()
+
+# --- マイグレーション ---
+# 各関数は1つ前のバージョンから自分のバージョンへスキーマを進める。
+# 既存データを捨てないこと (DROP TABLE は旧テーブルの移行後のみ)。
+def _migrate_v1(cur):
+    """v0 -> v1: 発表時刻ごとに履歴を残す forecasts テーブル"""
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'forecasts'")
+    has_legacy = cur.fetchone() is not None
+    if has_legacy:
+        # 旧バージョン (主キー: area_code, target_date) のテーブルを退避
+        cur.execute("ALTER TABLE forecasts RENAME TO forecasts_legacy")
+
+    # NOTE: 同じ地名でもコードが違うケース（API仕様）があるため、
+    # 表示時に地名による重複排除を行います。
+    # 同じ予報の再取得は主キーが一致するので上書き、新しい発表は別の行として残る。
+    cur.execute("""
+        CREATE TABLE forecasts (
+            area_code TEXT,
+            parent_code TEXT,
+            area_name TEXT,
+            target_date TEXT,
+            weather_code TEXT,
+            weather_text TEXT,
+            wind_text TEXT,
+            wave_text TEXT,
+            temps TEXT,
+            pops TEXT,
+            report_datetime TEXT,
+            data_source TEXT,
+            PRIMARY KEY (area_code, target_date, data_source, report_datetime)
+        )
+    """)
+
+    if has_legacy:
+        cur.execute("""
+            INSERT OR IGNORE INTO forecasts
+            SELECT area_code, parent_code, area_name, target_date,
+                   weather_code, weather_text, wind_text, wave_text,
+                   temps, pops, report_datetime, data_source
+            FROM forecasts_legacy
+        """)
+        cur.execute("DROP TABLE forecasts_legacy")
+
+def _migrate_v2(cur):
+    """v1 -> v2: (parent_code, target_date, data_source) の索引
+
+    get_available_dates (DISTINCT target_date) と get_forecasts_by_date の絞り込みを
+    索引だけで済ませる。report_datetime まで含めて最新の発表を索引順に引けるようにする。
+    """
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_forecasts_parent_date
+        ON forecasts (parent_code, target_date, data_source, report_datetime)
+    """)
+    cur.execute("ANALYZE forecasts")
+
+def _migrate_v3(cur):
+    """v2 -> v3: 気温・降水確率を整数の子テーブルに分け、min_temp / max_temp を持たせる
+
+    既存の行は temps / pops の文字列から子テーブルと min_temp / max_temp を埋める。
+    """
+    cur.execute("ALTER TABLE forecasts ADD COLUMN min_temp INTEGER")
+    cur.execute("ALTER TABLE forecasts ADD COLUMN max_temp INTEGER")
+    for table, value_col in (("forecast_temps", "temp"), ("forecast_pops", "pop")):
+        cur.execute(f"""
+            CREATE TABLE {table} (
+                area_code TEXT,
+                target_date TEXT,
+                data_source TEXT,
+                report_datetime TEXT,
+                seq INTEGER,
+                hour INTEGER,
+                {value_col} INTEGER NOT NULL,
+                PRIMARY KEY (area_code, target_date, data_source, report_datetime, seq),
+                FOREIGN KEY (area_code, target_date, data_source, report_datetime)
+                    REFERENCES forecasts (area_code, target_date, data_source, report_datetime)
+                    ON DELETE CASCADE
+            )
+        """)
+    # 「明日 降水確率70%以上の地域」のような範囲検索用
+    cur.execute("CREATE INDEX idx_forecast_pops_date_pop ON forecast_pops (target_date, pop)")
+    cur.execute("CREATE INDEX idx_forecast_temps_date_temp ON forecast_temps (target_date, temp)")
+
+    # 行の変換は v3 時点の決まりをここに固定する (ingest の列や ForecastBatch が変わっても結果を変えない)
+    def to_int(text):
+        try:
+            return int(text)
+        except (TypeError, ValueError):
+            return None
+
+    temp_rows, pop_rows, ranges = [], [], []
+    rows = cur.execute("SELECT area_code, target_date, data_source, report_datetime, temps, pops FROM forecasts").fetchall()
+    for area_code, target_date, data_source, report_datetime, temps, pops in rows:
+        key = (area_code, target_date, data_source, report_datetime)
+        values = []
+        # temps は '12,20' (時刻なし)
+        for seq, text in enumerate(temps.split(",") if temps else []):
+            temp = to_int(text)
+            if temp is not None:
+                values.append(temp)
+                temp_rows.append(key + (seq, None, temp))
+        # pops は '06時:20%,12時:30%' (短期) か '一日:30%' (週間)
+        for seq, text in enumerate(pops.split(",") if pops else []):
+            label, _, value = text.partition(":")
+            pop = to_int(value.rstrip("%"))
+            if pop is not None:
+                pop_rows.append(key + (seq, to_int(label.rstrip("時")), pop))
+        if values:
+            ranges.append((min(values), max(values)) + key)
+    cur.executemany(
+        "INSERT OR REPLACE INTO forecast_temps "
+        "(area_code, target_date, data_source, report_datetime, seq, hour, temp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        temp_rows,
+    )
+    cur.executemany(
+        "INSERT OR REPLACE INTO forecast_pops "
+        "(area_code, target_date, data_source, report_datetime, seq, hour, pop) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        pop_rows,
+    )
+    cur.executemany(
+        "UPDATE forecasts SET min_temp = ?, max_temp = ? "
+        "WHERE area_code = ? AND target_date = ? AND data_source = ? AND report_datetime = ?",
+        ranges,
+    )
+
+def _migrate_v4(cur):
+    """v3 -> v4: 発表月ごとの履歴アーカイブ (forecast_archive_YYYYMM)
+
+    既存の forecasts の行をすべてアーカイブに入れる。取り込んだ時刻は分からないので発表時刻で代用する。
+    """
+    # 列・テーブル定義・ハッシュの決め方は v4 時点のものをここに固定する
+    # (archive.py や FORECAST_COLUMNS が変わっても、古いDBに対する v4 の結果を変えない)
+    columns = (
+        "area_code", "parent_code", "area_name", "target_date",
+        "weather_code", "weather_text", "wind_text", "wave_text",
+        "temps", "pops", "report_datetime", "data_source",
+        "min_temp", "max_temp",
+    )
+    # 内容のハッシュに使う列 (キー = area_code, target_date, data_source, report_datetime 以外)
+    content = (1, 2, 4, 5, 6, 7, 8, 9, 12, 13)
+
+    by_month = {}
+    for row in cur.execute(f"SELECT {', '.join(columns)} FROM forecasts ORDER BY report_datetime").fetchall():
+        text = "\x1f".join("" if row[i] is None else str(row[i]) for i in content)
+        digest = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+        month = row[10][:4] + row[10][5:7]
+        if not re.fullmatch(r"\d{6}", month):
+            raise ValueError(f"発表時刻の形式が違います: {row[10]}")
+        by_month.setdefault(month, []).append(row + (digest, row[10]))
+
+    for month, rows in by_month.items():
+        table = f"forecast_archive_{month}"
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                parent_code TEXT,
+                area_code TEXT,
+                area_name TEXT,
+                target_date TEXT,
+                weather_code TEXT,
+                weather_text TEXT,
+                wind_text TEXT,
+                wave_text TEXT,
+                temps TEXT,
+                pops TEXT,
+                report_datetime TEXT,
+                data_source TEXT,
+                min_temp INTEGER,
+                max_temp INTEGER,
+                digest INTEGER NOT NULL,
+                fetched_at TEXT NOT NULL,
+                PRIMARY KEY (parent_code, target_date, area_code, data_source, report_datetime, digest)
+            ) WITHOUT ROWID
+        """)
+        archive_columns = columns + ("digest", "fetched_at")
+        cur.executemany(
+            f"INSERT OR IGNORE INTO {table} ({', '.join(archive_columns)}) "
+            f"VALUES ({', '.join('?' * len(archive_columns))})",
+            rows,
+        )
+
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+}
+
+def _apply_migration(conn, version):
+    """マイグレーション1つと user_version の更新を1トランザクションで行う
+
+    sqlite3 の既定の動作では DDL (ALTER / CREATE / DROP) の前に BEGIN が入らず、
+    途中で失敗すると半端なスキーマのまま user_version だけが古く残って、次の起動で同じ手順が失敗する。
+    isolation_level = None で自動のトランザクション管理を止め、DDL ごと BEGIN 〜 COMMIT に入れる。
+    """
+    isolation = conn.isolation_level
+    conn.isolation_level = None
+    cur = conn.cursor()
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+        # 別のプロセスが先に進めていたら何もしない
+        if cur.execute("PRAGMA user_version").fetchone()[0] == version - 1:
+            MIGRATIONS[version](cur)
+            # PRAGMA はパラメータを受け付けないので整数を埋め込む
+            cur.execute(f"PRAGMA user_version = {int(version)}")
+        cur.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    finally:
+        conn.isolation_level = isolation
+
+# --- 接続管理 ---
+class ConnectionPool:
+    """書き込み用の接続1本と読み込み用の接続プールを使い回す
+
+    接続は作成時に一度だけ開き、PRAGMA を設定する。
+    書き込みはロックで直列化し、読み込みはプールから借りるので
+    UIスレッドの読み込みとバックグラウンドの同期が互いを待たない。
+    """
+
+    def __init__(self, db_name, readers=READER_POOL_SIZE):
+        self.db_name = db_name
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        # journal_mode はDBファイルに記録されるので書き込み側で一度設定すればよい
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            conn = self._connect()
+            conn.execute("PRAGMA query_only = ON")
+            self._readers.put(conn)
+        self._all = [self._writer] + list(self._readers.queue)
+
+    def _connect(self):
+        # スレッドをまたいで使うので check_same_thread を外し、排他はこのクラスで行う
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """書き込み用接続 (with を抜けるときに commit、例外なら rollback)"""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    @contextmanager
+    def reader(self):
+        """読み込み用接続をプールから借りる"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        for conn in self._all:
+            conn.close()
+        self._all = []
+
+# --- データベース管理クラス ---
+class WeatherDatabase:
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.pool = ConnectionPool(db_name)
+        self.init_db()
+        self.archive = ForecastArchive(self.pool)
+
+    def close(self):
+        self.pool.close()
+
+    def init_db(self):
+        """スキーマを最新バージョンまでマイグレーションする (データは保持)"""
+        with self.pool.writer() as conn:
+            cur = conn.cursor()
+            version = cur.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise RuntimeError(f"DBのバージョン({version})がアプリ({SCHEMA_VERSION})より新しいです")
+
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                _apply_migration(conn, v)
+                print(f"🛠️ DBスキーマを v{v} に更新しました")
+
+    def sync_all_data(self, json_data, parent_code):
+        """週間予報と短期予報を同期"""
+        return self.sync_many([(parent_code, json_data)])
+
+    def sync_many(self, payloads):
+        """複数の (parent_code, json_data) をまとめて同期する
+
+        先にJSONを行タプルへ平坦化し、1トランザクションの executemany で書き込む。
+        """
+        start = time.perf_counter()
+        batch = ForecastBatch()
+        with tracing.span("ingest.build"):
+            for parent_code, json_data in payloads:
+                batch.extend(build_forecast_rows(json_data, parent_code))
+        return self.sync_batch(batch, start)
+
+    def sync_batch(self, batch, start=None):
+        """組み立て済みの ForecastBatch を書き込む
+
+        書き込みに失敗したら例外をそのまま投げる (呼び出し側でそのオフィスを失敗として扱う)。
+        """
+        start = time.perf_counter() if start is None else start
+        try:
+            with tracing.span("db.write"):
+                self.write_rows(batch)
+        except Exception as e:
+            print(f"❌ DB書き込みエラー: {e}")
+            tracing.count("db.write_error")
+            raise
+
+        stats = IngestStats(len(batch), time.perf_counter() - start)
+        print(f"📥 取り込み: {stats}")
+        return stats
+
+    def write_rows(self, batch):
+        """ForecastBatch (forecasts と子テーブルの行) を1トランザクションで書き込む
+
+        同じトランザクションで履歴アーカイブにも追記する (同じ内容の再取得は増えない)。
+        """
+        fetched_at = datetime.now(JST).isoformat()
+        with self.pool.writer() as conn:
+            # 親の行を先に書く (INSERT OR REPLACE で置き換わった行の子は外部キーで消えるので書き直す)
+            conn.executemany(INSERT_FORECAST_SQL, batch.forecasts)
+            conn.executemany(INSERT_FORECAST_TEMP_SQL, batch.temps)
+            conn.executemany(INSERT_FORECAST_POP_SQL, batch.pops)
+            with tracing.span("db.archive"):
+                archived, created = self.archive.append(conn, batch.forecasts, fetched_at)
+        # rollback されたらテーブルも消えるので、作った月を覚えるのはコミットの後
+        self.archive.remember(created)
+        tracing.count("archive.snapshot", archived)
+        return len(batch)
+
+    def get_latest_report_datetime(self, parent_code):
+        """保存済みの最新の発表時刻 (未取得なら None)"""
+        with self.pool.reader() as conn:
+            cur = conn.execute("SELECT MAX(report_datetime) FROM forecasts WHERE parent_code = ?", (parent_code,))
+            return cur.fetchone()[0]
+
+    def get_latest_report_datetimes(self):
+        """保存済みの全オフィスについて {parent_code: 最新の発表時刻}"""
+        with self.pool.reader() as conn:
+            cur = conn.execute("SELECT parent_code, MAX(report_datetime) FROM forecasts GROUP BY parent_code")
+            return dict(cur.fetchall())
+
+    def has_fresh_data(self, parent_code, now=None):
+        """直近の発表分が保存済みならネットワークに行かずにDBから表示できる"""
+        return is_report_fresh(self.get_latest_report_datetime(parent_code), now)
+
+    @tracing.traced("db.select_dates")
+    def get_available_dates(self, parent_code):
+        with self.pool.reader() as conn:
+            cur = conn.execute("SELECT DISTINCT target_date FROM forecasts WHERE parent_code = ? ORDER BY target_date", (parent_code,))
+            return [row[0] for row in cur.fetchall()]
+
+    @tracing.traced("db.select_forecasts")
+    def get_forecasts_by_date(self, parent_code, target_date):
+        """地名ごとに1行 ('short' 優先、同じ種類なら最新の発表) を返す
+
+        重複排除はウィンドウ関数で SQL 側に任せ、Python には表示する行だけを渡す。
+        """
+        with self.pool.reader() as conn:
+            cur = conn.cursor()
+            # プールの接続は共有なので row_factory はカーソル単位で設定する
+            cur.row_factory = sqlite3.Row
+            cur.execute(SELECT_FORECASTS_BY_DATE_SQL, (parent_code, target_date))
+            return cur.fetchall()
+
+    def find_areas_by_pop(self, target_date, min_pop=70):
+        """target_date に降水確率が min_pop% 以上の時間帯がある地域 (各地域の最新の発表のみ)"""
+        with self.pool.reader() as conn:
+            cur = conn.cursor()
+            cur.row_factory = sqlite3.Row
+            cur.execute(SELECT_AREAS_BY_POP_SQL, (target_date, min_pop))
+            return cur.fetchall()
+
+    # --- 履歴 (アーカイブ) ---
+    @tracing.traced("db.select_as_of")
+    def get_forecast_as_of(self, parent_code, target_date, report_datetime):
+        """report_datetime の時点で最新だった発表による target_date の予報 (地名ごとに1行)
+
+        report_datetime は datetime (タイムゾーン付き) か ISO形式の文字列。
+        行の列は get_forecasts_by_date と同じ (+ digest, fetched_at)。
+        """
+        return self.archive.as_of(parent_code, target_date, to_report_datetime(report_datetime))
+
+    def get_report_history(self, parent_code, target_date):
+        """target_date の予報を含む発表時刻の一覧 (古い順)"""
+        return self.archive.reports(parent_code, target_date)
+
+    @tracing.traced("db.compact")
+    def compact(self, now=None, retention_months=ARCHIVE_RETENTION_MONTHS, live_days=LIVE_RETENTION_DAYS):
+        """DBの大きさを抑える (バックグラウンドで定期的に呼ぶ)
+
+        - forecasts (表示用) から新しい発表に置き換わった行と live_days 日より前の日付を消す
+        - アーカイブは発表ごとに最後のスナップショットだけを残し、retention_months か月より前の月を消す
+        消えたページは次の書き込みで再利用される。最後に WAL を切り詰める。
+        """
+        now = (now or datetime.now(JST)).astimezone(JST)
+        start = time.perf_counter()
+        with self.pool.writer() as conn:
+            superseded = conn.execute(DELETE_SUPERSEDED_FORECASTS_SQL).rowcount
+            expired = conn.execute("DELETE FROM forecasts WHERE target_date < ?",
+                                   ((now - timedelta(days=live_days)).strftime("%Y-%m-%d"),)).rowcount
+            snapshots, dropped = self.archive.compact(conn, now, retention_months)
+        with self.pool.writer() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        stats = {"superseded": superseded, "expired": expired, "snapshots": snapshots, "dropped_months": dropped}
+        print(f"🧹 DB圧縮: {stats} ({(time.perf_counter() - start) * 1000:.0f}ms)")
+        return stats
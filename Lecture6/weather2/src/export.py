@@ -0,0 +1,189 @@
+import argparse
+import csv
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # pyarrow がなければ CSV だけ書き出せる
+    pa = pq = None
+
+from archive import ARCHIVE_LOOKBACK_DAYS, list_partitions, partition_table
+from database import WeatherDatabase
+from ingest import FORECAST_COLUMNS, parse_pop_text, to_int
+
+# --- 予報DBの書き出し (分析用) ---
+# forecasts テーブル (またはアーカイブ) を条件で絞り込み、chunk_size 行ずつ CSV / Parquet に書き出す。
+# SELECT は索引・主キーの順に読むので並べ替えの一時領域を使わず、
+# Python 側も1チャンク分しか持たないため、何年分のアーカイブでもメモリ使用量は一定。
+#
+# 例: python src/export.py forecasts.parquet --parent-code 130000 --from 2026-01-01 --to 2026-03-31
+#     python src/export.py - --archive > archive.csv
+
+EXPORT_CHUNK_SIZE = 5000
+# アーカイブから書き出すときは、取り込んだ時刻も付ける
+ARCHIVE_EXPORT_COLUMNS = FORECAST_COLUMNS + ("fetched_at",)
+
+def build_filter(parent_codes=None, date_from=None, date_to=None):
+    """(WHERE 句, パラメータ)。date_from / date_to は target_date の範囲 (両端を含む)"""
+    clauses, params = [], []
+    if parent_codes:
+        clauses.append(f"parent_code IN ({', '.join('?' * len(parent_codes))})")
+        params.extend(parent_codes)
+    if date_from:
+        clauses.append("target_date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("target_date <= ?")
+        params.append(date_to)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+def iter_chunks(conn, sql, params, chunk_size=EXPORT_CHUNK_SIZE):
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+def iter_forecast_chunks(db, parent_codes=None, date_from=None, date_to=None,
+                         chunk_size=EXPORT_CHUNK_SIZE, archive=False):
+    """条件に合う行を chunk_size 行ずつのリストで返す (列は export_columns(archive) の順)"""
+    where, params = build_filter(parent_codes, date_from, date_to)
+    with db.pool.reader() as conn:
+        if not archive:
+            # (parent_code, target_date, data_source, report_datetime) の索引順に読む
+            sql = (f"SELECT {', '.join(FORECAST_COLUMNS)} FROM forecasts{where} "
+                   "ORDER BY parent_code, target_date, data_source, report_datetime")
+            yield from iter_chunks(conn, sql, params, chunk_size)
+            return
+
+        # アーカイブは発表月のテーブルを古い順に1つずつ読む (日付の範囲に関係する月だけ)
+        first = ((date.fromisoformat(date_from) - timedelta(days=ARCHIVE_LOOKBACK_DAYS)).strftime("%Y%m")
+                 if date_from else "000000")
+        last = date.fromisoformat(date_to).strftime("%Y%m") if date_to else "999912"
+        for month in list_partitions(conn.cursor()):
+            if first <= month <= last:
+                sql = (f"SELECT {', '.join(ARCHIVE_EXPORT_COLUMNS)} FROM {partition_table(month)}{where} "
+                       "ORDER BY parent_code, target_date, area_code, data_source, report_datetime, digest")
+                yield from iter_chunks(conn, sql, params, chunk_size)
+
+def export_columns(archive=False):
+    return ARCHIVE_EXPORT_COLUMNS if archive else FORECAST_COLUMNS
+
+# --- 書き出し先 ---
+class CsvSink:
+    """表示用と同じ文字列のまま書き出す (temps / pops も元の文字列)"""
+
+    def __init__(self, path, columns):
+        self._file = sys.stdout if path == "-" else open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class ParquetSink:
+    """列ごとの型付きで書き出す。1チャンクが1つの row group になる
+
+    temps は整数のリスト、pops は (hour, pop) のリスト。日付・発表時刻は date / timestamp 型。
+    """
+
+    def __init__(self, path, columns):
+        if pa is None:
+            raise RuntimeError("Parquet に書き出すには pyarrow が必要です (pip install pyarrow)")
+        self.columns = columns
+        types = {
+            "target_date": pa.date32(),
+            "report_datetime": pa.timestamp("ms", tz="Asia/Tokyo"),
+            "fetched_at": pa.timestamp("us", tz="Asia/Tokyo"),
+            "temps": pa.list_(pa.int16()),
+            "pops": pa.list_(pa.struct([("hour", pa.int8()), ("pop", pa.int16())])),
+            "min_temp": pa.int16(),
+            "max_temp": pa.int16(),
+        }
+        self.schema = pa.schema([(c, types.get(c, pa.string())) for c in columns])
+        self._writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    @staticmethod
+    def _convert(column, values):
+        if column == "target_date":
+            return [date.fromisoformat(v) if v else None for v in values]
+        if column in ("report_datetime", "fetched_at"):
+            return [datetime.fromisoformat(v) if v else None for v in values]
+        if column == "temps":
+            return [[t for t in map(to_int, v.split(",")) if t is not None] if v else [] for v in values]
+        if column == "pops":
+            return [[{"hour": hour, "pop": pop} for hour, pop in
+                     ((h, to_int(p)) for h, p in map(parse_pop_text, v.split(","))) if pop is not None]
+                    if v else [] for v in values]
+        return values
+
+    def write(self, rows):
+        arrays = [pa.array(self._convert(c, list(values)), type=field.type)
+                  for c, field, values in zip(self.columns, self.schema, zip(*rows))]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+def export(db, path, fmt="csv", parent_codes=None, date_from=None, date_to=None,
+           chunk_size=EXPORT_CHUNK_SIZE, archive=False):
+    """条件に合う予報を path に書き出して行数を返す"""
+    start = time.perf_counter()
+    columns = export_columns(archive)
+    sink = SINKS[fmt](path, columns)
+    total = 0
+    try:
+        for rows in iter_forecast_chunks(db, parent_codes, date_from, date_to, chunk_size, archive):
+            sink.write(rows)
+            total += len(rows)
+    finally:
+        sink.close()
+    print(f"📤 書き出し: {total:,} 行 → {path} ({time.perf_counter() - start:.1f}秒)", file=sys.stderr)
+    return total
+
+# --- コマンドライン ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="予報DBを CSV / Parquet に書き出す")
+    parser.add_argument("out", help="出力ファイル (- なら CSV を標準出力へ)")
+    parser.add_argument("--db", default="weather_app.db")
+    parser.add_argument("--format", choices=sorted(SINKS), help="省略時は拡張子から (.parquet 以外は CSV)")
+    parser.add_argument("--parent-code", action="append", dest="parent_codes", help="オフィスコード (複数指定可)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="target_date の開始 (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="target_date の終了 (YYYY-MM-DD)")
+    parser.add_argument("--archive", action="store_true", help="表示用の forecasts ではなく履歴アーカイブ全体を書き出す")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("parquet" if args.out.endswith(".parquet") else "csv")
+    if fmt == "parquet" and pa is None:
+        print("❌ Parquet に書き出すには pyarrow が必要です (pip install pyarrow)", file=sys.stderr)
+        return 2
+    if fmt == "parquet" and args.out == "-":
+        parser.error("Parquet は標準出力に書き出せません")
+
+    # マイグレーションのメッセージが CSV (標準出力) に混ざらないようにする
+    with redirect_stdout(sys.stderr):
+        db = WeatherDatabase(args.db)
+    try:
+        export(db, args.out, fmt, args.parent_codes,
+               args.date_from.isoformat() if args.date_from else None,
+               args.date_to.isoformat() if args.date_to else None,
+               args.chunk_size, args.archive)
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
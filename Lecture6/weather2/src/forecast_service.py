@@ -0,0 +1,134 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import tracing
+from database import WeatherDatabase
+from jma_client import PREFETCH_WORKERS, prefetch_all, sync_office
+
+# --- 全セッション共有の予報サービス ---
+# Flet の Web アプリではブラウザのセッションごとに main(page) が動く。
+# DB接続・表示用の読み込み結果・気象庁への取得をプロセスで1つにまとめ、
+# 同じ都道府県を見ているセッションが何人いても、DBの読み込みと取得は1回で済むようにする。
+
+# 共有キャッシュに残す (オフィス, 日付) の数
+HOT_CACHE_SIZE = 512
+
+class ForecastService:
+    def __init__(self, db_name, cache=None, hot_size=HOT_CACHE_SIZE):
+        self.db = WeatherDatabase(db_name)
+        self.cache = cache
+        self.hot_size = hot_size
+        # (オフィス, 日付) -> 予報の行。日付が None のキーには日付一覧を入れる
+        self._hot = OrderedDict()
+        # オフィスごとの世代。同期のたびに進め、読み込み中に古くなった結果を入れないようにする
+        self._generations = {}
+        # 全オフィス共通の世代 (圧縮などでDB全体が変わったとき)
+        self._epoch = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.joined = 0
+
+    def close(self):
+        self.db.close()
+
+    # --- 読み込み (共有キャッシュ経由) ---
+    def _cached(self, office_code, target_date, load):
+        key = (office_code, target_date)
+        with self._lock:
+            value = self._hot.get(key)
+            if value is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                tracing.count("service.hit")
+                return value
+            self.misses += 1
+            tracing.count("service.miss")
+            generation = (self._epoch, self._generations.get(office_code, 0))
+
+        value = load()
+        with self._lock:
+            # 読み込み中に同期が入っていたら、古いかもしれない結果はキャッシュしない
+            if (self._epoch, self._generations.get(office_code, 0)) == generation:
+                self._hot[key] = value
+                if len(self._hot) > self.hot_size:
+                    self._hot.popitem(last=False)
+        return value
+
+    def get_available_dates(self, office_code):
+        return self._cached(office_code, None, lambda: self.db.get_available_dates(office_code))
+
+    def get_forecasts_by_date(self, office_code, target_date):
+        return self._cached(office_code, target_date, lambda: self.db.get_forecasts_by_date(office_code, target_date))
+
+    def has_fresh_data(self, office_code, now=None):
+        return self.db.has_fresh_data(office_code, now)
+
+    def invalidate(self, office_code=None):
+        """オフィスの共有キャッシュを捨てる (DBに新しい発表が入ったとき)。None なら全オフィス"""
+        with self._lock:
+            if office_code is None:
+                self._epoch += 1
+                self._hot.clear()
+                return
+            self._generations[office_code] = self._generations.get(office_code, 0) + 1
+            for key in [k for k in self._hot if k[0] == office_code]:
+                del self._hot[key]
+
+    # --- 履歴 (アーカイブから読むので共有キャッシュは通さない) ---
+    def get_forecast_as_of(self, office_code, target_date, report_datetime):
+        return self.db.get_forecast_as_of(office_code, target_date, report_datetime)
+
+    def get_report_history(self, office_code, target_date):
+        return self.db.get_report_history(office_code, target_date)
+
+    def compact(self, now=None):
+        """DBを圧縮し、消えた行を返さないよう共有キャッシュを捨てる"""
+        stats = self.db.compact(now)
+        self.invalidate()
+        return stats
+
+    # --- 取得 (同じオフィスへの同時取得は1回にまとめる) ---
+    def sync_office(self, office_code, **fetch_kwargs):
+        """オフィスの予報を取得してDBに同期する。取得中なら新たに取りに行かず、その結果を待つ"""
+        with self._lock:
+            future = self._inflight.get(office_code)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[office_code] = future
+                self.fetches += 1
+            else:
+                self.joined += 1
+                tracing.count("service.joined")
+        if not leader:
+            return future.result()
+
+        try:
+            synced = sync_office(self.db, office_code, self.cache, **fetch_kwargs)
+            if synced:
+                self.invalidate(office_code)
+            future.set_result(synced)
+            return synced
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[office_code]
+
+    def _sync_for_prefetch(self, db, office_code, cache, url_template, **fetch_kwargs):
+        return self.sync_office(office_code, url_template=url_template, **fetch_kwargs)
+
+    def prefetch_all(self, office_codes, max_workers=PREFETCH_WORKERS, on_progress=None, **fetch_kwargs):
+        """jma_client.prefetch_all と同じ。1件ごとの取得は sync_office を通る"""
+        return prefetch_all(self.db, office_codes, max_workers=max_workers, cache=self.cache,
+                            on_progress=on_progress, sync=self._sync_for_prefetch, **fetch_kwargs)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "fetches": self.fetches,
+                    "joined": self.joined, "cached": len(self._hot)}
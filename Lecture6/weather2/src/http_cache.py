@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+
+# --- HTTPキャッシュ ---
+# 取得したJSONとバリデータ (ETag / Last-Modified) をディスクに保存し、
+# 次回は If-None-Match / If-Modified-Since 付きで問い合わせる。
+# 304 Not Modified なら本文をダウンロードせずに保存済みのJSONを使う。
+
+HTTP_CACHE_DIR = "http_cache"
+
+class HttpCache:
+    def __init__(self, cache_dir=HTTP_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, ext):
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def _read_meta(self, url):
+        try:
+            with open(self._path(url, "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path, data):
+        # 別スレッドが読み込み中でも壊れたファイルが見えないよう、一時ファイルから置き換える
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def conditional_headers(self, url):
+        """保存済みのバリデータから条件付きリクエストのヘッダーを作る"""
+        meta = self._read_meta(url)
+        if not meta or not self.has_body(url):
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def has_body(self, url):
+        return os.path.exists(self._path(url, "json"))
+
+    def body_mtime(self, url):
+        """保存済みの本文の更新時刻 (なければ None)"""
+        try:
+            return os.path.getmtime(self._path(url, "json"))
+        except OSError:
+            return None
+
+    def open(self, url):
+        """保存済みの本文をバイナリで開く (なければ None)。逐次パーサーに渡す用"""
+        try:
+            return open(self._path(url, "json"), "rb")
+        except OSError:
+            return None
+
+    def load(self, url):
+        """保存済みのJSON (なければ None)"""
+        try:
+            with open(self._path(url, "json"), "rb") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def not_modified(self, url, decode=True):
+        """304 のとき保存済みの本文で答える。(JSON, 答えられたか) を返す (decode=False なら JSON は None)"""
+        if not decode:
+            return None, self.has_body(url)
+        data = self.load(url)
+        return data, data is not None
+
+    def store(self, url, response, decode=True):
+        """200 のレスポンス本文とバリデータを保存して、デコードしたJSONを返す (decode=False なら None)"""
+        data = response.json() if decode else None
+        self._write_atomic(self._path(url, "json"), response.content)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        self._write_atomic(self._path(url, "meta.json"), json.dumps(meta).encode("utf-8"))
+        return data
+
+    def get(self, url, session=None, timeout=10, decode=True):
+        """条件付きGET。(JSON, 304だったか) を返す
+
+        HTTPエラーは requests の例外 (raise_for_status) としてそのまま送出する。
+        decode=False なら保存だけして JSON は None を返す (本文は open() で逐次読む)。
+        """
+        res = (session or requests).get(url, headers=self.conditional_headers(url), timeout=timeout)
+        if res.status_code == 304:
+            data, hit = self.not_modified(url, decode)
+            if hit:
+                return data, True
+            # キャッシュが消えていたら条件なしで取り直す
+            res = (session or requests).get(url, timeout=timeout)
+        res.raise_for_status()
+        return self.store(url, res, decode), False
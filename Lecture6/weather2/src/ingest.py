@@ -0,0 +1,267 @@
+import json
+from datetime import datetime
+
+try:
+    import ijson
+except ImportError:
+    # ijson がなければ json で全体を読んでから reportDatetime を取り出す (結果は同じ)
+    ijson = None
+
+# --- 取り込み処理 ---
+# 気象庁の予報JSONを forecasts テーブルと子テーブル (forecast_temps / forecast_pops) の
+# 行 (タプル) に平坦化する。
+# DBには触らないので、行の組み立てと書き込み (executemany) を分けて計測できる。
+
+# 行タプルの列順 (INSERT 文と一致させること)
+# temps / pops は表示用の文字列。集計・検索には min_temp / max_temp と子テーブルを使う。
+FORECAST_COLUMNS = (
+    "area_code", "parent_code", "area_name", "target_date",
+    "weather_code", "weather_text", "wind_text", "wave_text",
+    "temps", "pops", "report_datetime", "data_source",
+    "min_temp", "max_temp",
+)
+# 子テーブルの列順。hour は週間予報 (時刻なし) では NULL
+FORECAST_TEMP_COLUMNS = ("area_code", "target_date", "data_source", "report_datetime", "seq", "hour", "temp")
+FORECAST_POP_COLUMNS = ("area_code", "target_date", "data_source", "report_datetime", "seq", "hour", "pop")
+
+# --- 天気コード辞書 (週間予報用) ---
+WEATHER_CODE_MAP = {
+    "100": "晴れ", "101": "晴時々曇", "110": "晴後時々曇", "111": "晴後曇",
+    "200": "曇り", "201": "曇時々晴", "202": "曇一時雨", "203": "曇時々雨", "210": "曇後時々晴", "211": "曇後晴", "212": "曇後一時雨", "214": "曇後雨",
+    "300": "雨", "301": "雨時々晴", "302": "雨時々止む", "303": "雨時々雪", "311": "雨後晴", "313": "雨後曇",
+    "400": "雪", "401": "雪時々晴", "402": "雪時々止む", "403": "雪時々雨", "411": "雪後晴", "413": "雪後曇"
+}
+
+def get_weather_text_by_code(code):
+    if code in WEATHER_CODE_MAP:
+        return WEATHER_CODE_MAP[code]
+    c = int(code)
+    if 100 <= c < 200: return "晴れ系"
+    if 200 <= c < 300: return "曇り系"
+    if 300 <= c < 400: return "雨系"
+    if 400 <= c < 500: return "雪系"
+    return "不明"
+
+class IngestStats:
+    """取り込み1回分の件数と所要時間"""
+
+    def __init__(self, rows=0, seconds=0.0):
+        self.rows = rows
+        self.seconds = seconds
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return f"{self.rows}件 / {self.seconds * 1000:.1f}ms ({self.rows_per_sec:,.0f} rows/s)"
+
+class ForecastBatch:
+    """1回の取り込みで書き込む行 (forecasts と子テーブル) をまとめたもの"""
+
+    def __init__(self):
+        self.forecasts = []
+        self.temps = []
+        self.pops = []
+
+    def __len__(self):
+        return len(self.forecasts)
+
+    def latest_report_datetime(self):
+        """含まれる行の中で最も新しい reportDatetime (行がなければ None)"""
+        return max((f[10] for f in self.forecasts), default=None)
+
+    def extend(self, other):
+        self.forecasts.extend(other.forecasts)
+        self.temps.extend(other.temps)
+        self.pops.extend(other.pops)
+
+    def add(self, forecast, temps, pops):
+        """forecast は min_temp / max_temp を除いた行、temps / pops は [(hour, 値の文字列)]"""
+        key = (forecast[0], forecast[3], forecast[11], forecast[10])  # area_code, target_date, data_source, report_datetime
+        temp_values = []
+        for seq, (hour, val) in enumerate(temps):
+            temp = to_int(val)
+            if temp is not None:
+                temp_values.append(temp)
+                self.temps.append(key + (seq, hour, temp))
+        for seq, (hour, val) in enumerate(pops):
+            pop = to_int(val)
+            if pop is not None:
+                self.pops.append(key + (seq, hour, pop))
+        self.forecasts.append(forecast + (
+            min(temp_values) if temp_values else None,
+            max(temp_values) if temp_values else None,
+        ))
+
+def to_int(val):
+    """'12' -> 12、空文字や数値でないものは None"""
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
+
+def parse_pop_text(text):
+    """表示用の降水確率の1項目 -> (時, 値の文字列)。'06時:20%' -> (6, '20')、'一日:30%' -> (None, '30')"""
+    label, _, value = text.partition(":")
+    return to_int(label.rstrip("時")), value.rstrip("%")
+
+def parse_time_defines(time_defines):
+    """timeDefines を1回だけ解析して (日付 'YYYY-MM-DD', 時 'HH') のリストにする"""
+    parsed = []
+    for t_str in time_defines:
+        dt = datetime.fromisoformat(t_str)
+        parsed.append((dt.strftime('%Y-%m-%d'), dt.strftime('%H')))
+    return parsed
+
+def index_by_date(parsed_times):
+    """日付 -> その日の timeDefines のインデックス一覧"""
+    index = {}
+    for i, (date, _) in enumerate(parsed_times):
+        index.setdefault(date, []).append(i)
+    return index
+
+def build_weekly_rows(data, parent_code, batch=None):
+    """週間予報 (Index 1) を ForecastBatch に追加する"""
+    batch = batch if batch is not None else ForecastBatch()
+    report_datetime = data['reportDatetime']
+    ts_weather = data['timeSeries'][0]
+    target_dates = [date for date, _ in parse_time_defines(ts_weather['timeDefines'])]
+
+    ts_temps = data['timeSeries'][1] if len(data['timeSeries']) > 1 else None
+
+    for area_idx, area in enumerate(ts_weather['areas']):
+        a_code = area['area']['code']
+        a_name = area['area']['name']
+        pops = area.get('pops')
+
+        temp_area = ts_temps['areas'][area_idx] if ts_temps else None
+
+        for i, target_date in enumerate(target_dates):
+            w_code = area['weatherCodes'][i]
+            w_text = get_weather_text_by_code(w_code)
+
+            pop_val = pops[i] if pops and pops[i] else ""
+            pops_str = f"一日:{pop_val}%" if pop_val else ""
+
+            temps_list = []
+            if temp_area:
+                # 週間予報の気温(Min/Max)
+                try:
+                    min_t = temp_area['tempsMin'][i]
+                    max_t = temp_area['tempsMax'][i]
+                    if min_t and min_t.strip(): temps_list.append(min_t)
+                    if max_t and max_t.strip(): temps_list.append(max_t)
+                except IndexError:
+                    pass # データ不足時はスキップ
+
+            batch.add(
+                (a_code, parent_code, a_name, target_date,
+                 w_code, w_text, "", "",
+                 ",".join(temps_list), pops_str, report_datetime, 'weekly'),
+                [(None, t) for t in temps_list],
+                [(None, pop_val)] if pop_val else [],
+            )
+    return batch
+
+def build_short_rows(data, parent_code, batch=None):
+    """短期予報 (Index 0) を ForecastBatch に追加する
+
+    気温・降水確率の timeDefines は timeSeries ごとに1回だけ解析し、
+    日付 -> インデックスの索引を引いて天気の行と結合する。
+    """
+    batch = batch if batch is not None else ForecastBatch()
+    report_datetime = data['reportDatetime']
+    ts_weather = data['timeSeries'][0]
+    target_dates = [date for date, _ in parse_time_defines(ts_weather['timeDefines'])]
+
+    ts_temps = data['timeSeries'][2] if len(data['timeSeries']) > 2 else None
+    temp_times = parse_time_defines(ts_temps['timeDefines']) if ts_temps else []
+    temp_index = index_by_date(temp_times)
+
+    ts_pops = data['timeSeries'][1] if len(data['timeSeries']) > 1 else None
+    pop_times = parse_time_defines(ts_pops['timeDefines']) if ts_pops else []
+    pop_index = index_by_date(pop_times)
+
+    for area_idx, area_data in enumerate(ts_weather['areas']):
+        a_code = area_data['area']['code']
+        a_name = area_data['area']['name']
+        waves = area_data.get('waves', [])
+
+        temp_vals = ts_temps['areas'][area_idx]['temps'] if ts_temps and area_idx < len(ts_temps['areas']) else None
+        pop_vals = ts_pops['areas'][area_idx]['pops'] if ts_pops and area_idx < len(ts_pops['areas']) else None
+
+        for time_idx, target_date in enumerate(target_dates):
+            w_code = area_data['weatherCodes'][time_idx]
+            w_text = area_data['weathers'][time_idx]
+            wind_text = area_data['winds'][time_idx]
+            wave_text = waves[time_idx] if time_idx < len(waves) else ""
+
+            # 気温
+            temps = []
+            if temp_vals is not None:
+                for t_idx in temp_index.get(target_date, ()):
+                    val = temp_vals[t_idx]
+                    if val and val.strip(): temps.append((int(temp_times[t_idx][1]), val))
+
+            # 降水確率
+            pops = []
+            if pop_vals is not None:
+                for p_idx in pop_index.get(target_date, ()):
+                    val = pop_vals[p_idx]
+                    if val and val.strip(): pops.append((int(pop_times[p_idx][1]), val))
+
+            batch.add(
+                (a_code, parent_code, a_name, target_date,
+                 w_code, w_text, wind_text, wave_text,
+                 ",".join(v for _, v in temps),
+                 ",".join(f"{hour:02d}時:{v}%" for hour, v in pops),
+                 report_datetime, 'short'),
+                temps,
+                pops,
+            )
+    return batch
+
+def build_report_rows(reports, parent_code):
+    """発表 (短期, 週間 の順) を1つずつ受け取って ForecastBatch にする
+
+    片方の形式が壊れていても、もう片方は取り込む。
+    """
+    batch = ForecastBatch()
+    for index, report in enumerate(reports):
+        if index == 0:
+            try:
+                batch.extend(build_short_rows(report, parent_code))
+            except Exception as e:
+                print(f"❌ 短期予報処理エラー: {e}")
+        elif index == 1:
+            try:
+                batch.extend(build_weekly_rows(report, parent_code))
+            except Exception as e:
+                print(f"⚠️ 週間予報処理エラー: {e}")
+    return batch
+
+def build_forecast_rows(json_data, parent_code):
+    """予報JSON (短期+週間) 全体を ForecastBatch にする"""
+    # データ構造チェック
+    if not isinstance(json_data, list):
+        print("❌ データ形式エラー")
+        return ForecastBatch()
+    return build_report_rows(json_data, parent_code)
+
+# --- 発表時刻だけの読み込み ---
+# HTTPキャッシュの本文から reportDatetime だけを読み、更新がないときは本文全体をデコードしない。
+# 予報JSONは発表2件 (短期・週間) だけなので、取り込むときは json で全体を読む
+# (発表1件ずつ逐次読んでもピークは下がらず、json.loads より遅くメモリも多かった)。
+
+def latest_report_datetime_from_file(fp):
+    """予報JSON のファイル (バイナリ) の中で最も新しい reportDatetime (発表がなければ None)
+
+    ijson があれば reportDatetime だけを逐次読み、発表の中身はオブジェクトにしない。
+    """
+    if ijson is None:
+        data = json.load(fp)
+        if not isinstance(data, list):
+            raise ValueError("予報JSONがリストではありません")
+        return max((report["reportDatetime"] for report in data), default=None)
+    return max(ijson.items(fp, "item.reportDatetime"), default=None)
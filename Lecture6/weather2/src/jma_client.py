@@ -0,0 +1,178 @@
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import tracing
+from http_cache import HTTP_CACHE_DIR, HttpCache
+from ingest import latest_report_datetime_from_file
+
+# --- 定数 ---
+AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
+FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
+
+REQUEST_TIMEOUT = 10
+# 気象庁への同時接続数の上限 (多すぎるとサーバーに負荷をかける)
+PREFETCH_WORKERS = 8
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+# 再試行する HTTP ステータス (4xx は再試行しても結果が変わらない)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# requests.Session はスレッド間で共有しない
+_local = threading.local()
+
+def get_session():
+    """スレッドごとの Session (Keep-Alive で接続を使い回す)"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+def fetch_json_conditional(url, cache=None, retries=MAX_RETRIES, backoff=BACKOFF_BASE, timeout=REQUEST_TIMEOUT,
+                           decode=True):
+    """URL の JSON を取得して (JSON, 304だったか) を返す
+
+    通信エラーと 429/5xx は指数バックオフで再試行する。
+    cache (HttpCache) を渡すと ETag / Last-Modified で条件付きリクエストを送る。
+    cache があって decode=False なら本文は保存するだけで JSON は None (cache.open で逐次読む)。
+    """
+    decode = decode or cache is None
+    for attempt in range(retries + 1):
+        try:
+            headers = cache.conditional_headers(url) if cache else {}
+            with tracing.span("fetch.http"):
+                res = get_session().get(url, headers=headers, timeout=timeout)
+            tracing.count(f"http.{res.status_code}")
+            if res.status_code == 304 and cache:
+                with tracing.span("fetch.cache_load"):
+                    data, hit = cache.not_modified(url, decode)
+                if hit:
+                    return data, True
+                # 本文のキャッシュが消えていたら条件なしで取り直す
+                with tracing.span("fetch.http"):
+                    res = get_session().get(url, timeout=timeout)
+            if res.status_code not in RETRY_STATUS:
+                res.raise_for_status()
+                with tracing.span("fetch.parse"):
+                    return (cache.store(url, res, decode) if cache else res.json()), False
+            error = requests.exceptions.HTTPError(f"{res.status_code} Error: {url}", response=res)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        if attempt >= retries:
+            raise error
+        tracing.count("http.retry")
+        # 同時に失敗したスレッドが同じタイミングで再試行しないよう揺らぎを入れる
+        wait = backoff * (2 ** attempt) * (1 + random.random())
+        print(f"🔁 {url} 再試行 {attempt + 1}/{retries} ({wait:.1f}秒後): {error}")
+        time.sleep(wait)
+
+def fetch_json(url, cache=None, **kwargs):
+    return fetch_json_conditional(url, cache, **kwargs)[0]
+
+def fetch_forecast(office_code, url_template=FORECAST_URL, **kwargs):
+    return fetch_json(url_template.format(office_code), **kwargs)
+
+def get_report_datetime(json_data):
+    """予報JSON (短期+週間) の中で最も新しい reportDatetime"""
+    return max(d["reportDatetime"] for d in json_data)
+
+@tracing.traced("sync.office")
+def sync_office(db, office_code, cache=None, url_template=FORECAST_URL, **fetch_kwargs):
+    """1オフィスの予報を取得してDBに同期する。同期しなかった (変化なし) 場合は False
+
+    304 で本文が変わっていない、または 200 でも reportDatetime が保存済みと同じなら
+    DBの再同期を丸ごと省略する。
+    cache があれば本文はデコードせずキャッシュに保存し、まず reportDatetime だけを逐次読んで比べる。
+    発表が新しいときだけ、保存した本文を json で読んで取り込む。
+    """
+    url = url_template.format(office_code)
+    if cache is None:
+        data, not_modified = fetch_json_conditional(url, None, **fetch_kwargs)
+        report_datetime = get_report_datetime(data)
+    else:
+        _, not_modified = fetch_json_conditional(url, cache, decode=False, **fetch_kwargs)
+        with _open_cached(cache, url) as fp, tracing.span("ingest.report_datetime"):
+            report_datetime = latest_report_datetime_from_file(fp)
+
+    if report_datetime == db.get_latest_report_datetime(office_code):
+        print(f"⏭️ {office_code} は更新なし ({'304' if not_modified else '同じ発表時刻'})")
+        tracing.count("sync.unchanged")
+        return False
+    if cache is not None:
+        with tracing.span("fetch.cache_load"):
+            data = cache.load(url)
+        if data is None:
+            raise OSError(f"{url} の本文をキャッシュから読めません")
+    db.sync_all_data(data, office_code)
+    return True
+
+def _open_cached(cache, url):
+    fp = cache.open(url)
+    if fp is None:
+        raise OSError(f"{url} の本文がキャッシュにありません")
+    return fp
+
+def prefetch_all(db, office_codes, max_workers=PREFETCH_WORKERS, url_template=FORECAST_URL,
+                 cache=None, on_progress=None, sync=sync_office, **fetch_kwargs):
+    """全オフィスの予報を並列に取得して db.sync_all_data に流し込む
+
+    取得はスレッドプール (同時 max_workers 件まで) で行い、取得できたものから順に同期する。
+    cache を渡すと条件付きリクエストになり、更新のないオフィスは同期を省略する。
+    on_progress(done, total, office_code, error) で進捗を受け取れる。
+    sync には sync_office と同じ引数を取る関数を渡して1件ごとの同期を差し替えられる。
+    戻り値は (取得できたコードのリスト (更新なしを含む), {失敗したコード: 例外})
+    """
+    office_codes = list(office_codes)
+    synced, failed = [], {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch") as pool:
+        futures = {pool.submit(sync, db, code, cache, url_template, **fetch_kwargs): code for code in office_codes}
+        for done, future in enumerate(as_completed(futures), start=1):
+            code = futures[future]
+            error = None
+            try:
+                future.result()
+                synced.append(code)
+            except Exception as e:
+                error = e
+                failed[code] = e
+                print(f"⚠️ {code} の取得に失敗: {e}")
+            if on_progress:
+                on_progress(done, len(office_codes), code, error)
+
+    print(f"🌐 一括取得: {len(synced)}/{len(office_codes)} 件 ({time.perf_counter() - start:.1f}秒, 同時{max_workers}件)")
+    return synced, failed
+
+# --- コマンドライン ---
+# 例: python src/jma_client.py --workers 8 --db weather_app.db
+#     スタブサーバーに向ける場合は --area-url / --forecast-url を指定する
+def main(argv=None):
+    from database import WeatherDatabase
+
+    parser = argparse.ArgumentParser(description="全オフィスの予報を一括取得してDBに保存する")
+    parser.add_argument("--db", default="weather_app.db")
+    parser.add_argument("--workers", type=int, default=PREFETCH_WORKERS)
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--area-url", default=AREA_URL)
+    parser.add_argument("--forecast-url", default=FORECAST_URL, help="{} にオフィスコードが入る")
+    parser.add_argument("--cache-dir", default=HTTP_CACHE_DIR, help="空文字ならHTTPキャッシュを使わない")
+    args = parser.parse_args(argv)
+
+    cache = HttpCache(args.cache_dir) if args.cache_dir else None
+    area_json = fetch_json(args.area_url, cache, retries=args.retries)
+    db = WeatherDatabase(args.db)
+    try:
+        _, failed = prefetch_all(db, area_json["offices"].keys(), max_workers=args.workers,
+                                 url_template=args.forecast_url, cache=cache, retries=args.retries)
+    finally:
+        db.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,244 +1,29 @@
 import flet as ft
-import requests
-import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+from area_index import LEVEL_LABELS
+from area_store import AreaStore
+from forecast_service import ForecastService
+from http_cache import HttpCache
+from latest_task import EventLatency, LatestOnly
+from publication import JST, staleness
+from scheduler import SyncScheduler
+import tracing
+
 # --- 定数 ---
 DB_NAME = "weather_app.db"
-AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
-FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{}.json"
-
-# --- 天気コード辞書 (週間予報用) ---
-WEATHER_CODE_MAP = {
-    "100": "晴れ", "101": "晴時々曇", "110": "晴後時々曇", "111": "晴後曇",
-    "200": "曇り", "201": "曇時々晴", "202": "曇一時雨", "203": "曇時々雨", "210": "曇後時々晴", "211": "曇後晴", "212": "曇後一時雨", "214": "曇後雨",
-    "300": "雨", "301": "雨時々晴", "302": "雨時々止む", "303": "雨時々雪", "311": "雨後晴", "313": "雨後曇",
-    "400": "雪", "401": "雪時々晴", "402": "雪時々止む", "403": "雪時々雨", "411": "雪後晴", "413": "雪後曇"
-}
-
-def get_weather_text_by_code(code):
-    if code in WEATHER_CODE_MAP:
-        return WEATHER_CODE_MAP[code]
-    c = int(code)
-    if 100 <= c < 200: return "晴れ系"
-    if 200 <= c < 300: return "曇り系"
-    if 300 <= c < 400: return "雨系"
-    if 400 <= c < 500: return "雪系"
-    return "不明"
-
-# --- データベース管理クラス ---
-class WeatherDatabase:
-    def __init__(self, db_name):
-        self.db_name = db_name
-        self.init_db()
-
-    def get_conn(self):
-        return sqlite3.connect(self.db_name)
-
-    def init_db(self):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        
-        # テーブル初期化
-        cur.execute("DROP TABLE IF EXISTS forecasts")
-        
-        # NOTE: area_codeとtarget_dateの複合主キーにしていますが、
-        # 同じ地名でもコードが違うケース（API仕様）があるため、
-        # 表示時に Python側で地名による重複排除を行います。
-        sql_create_forecasts = """
-        CREATE TABLE forecasts (
-            area_code TEXT,
-            parent_code TEXT,
-            area_name TEXT,
-            target_date TEXT,
-            weather_code TEXT,
-            weather_text TEXT,
-            wind_text TEXT,
-            wave_text TEXT,
-            temps TEXT,
-            pops TEXT,
-            report_datetime TEXT,
-            data_source TEXT,
-            PRIMARY KEY (area_code, target_date)
-        );
-        """
-        cur.execute(sql_create_forecasts)
-        conn.commit()
-        conn.close()
-
-    def sync_all_data(self, json_data, parent_code):
-        """週間予報と短期予報を同期"""
-        # データ構造チェック
-        if not isinstance(json_data, list):
-            print("❌ データ形式エラー")
-            return
-
-        # 1. 週間予報 (Index 1)
-        if len(json_data) > 1:
-            self._sync_weekly_forecast(json_data[1], parent_code)
-            
-        # 2. 短期予報 (Index 0) - こちらを後から処理してUPDATE等も可能だが
-        #    主キー(area_code)が異なる場合があるので、INSERT自体は両方行われる可能性がある。
-        self._sync_short_forecast(json_data[0], parent_code)
-
-    def _sync_weekly_forecast(self, data, parent_code):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        try:
-            report_datetime = data['reportDatetime']
-            ts_weather = data['timeSeries'][0]
-            time_defines = ts_weather['timeDefines']
-            
-            ts_temps = data['timeSeries'][1] if len(data['timeSeries']) > 1 else None
-            
-            for area_idx, area in enumerate(ts_weather['areas']):
-                a_code = area['area']['code']
-                a_name = area['area']['name']
-                
-                temp_area = ts_temps['areas'][area_idx] if ts_temps else None
-
-                for i, t_str in enumerate(time_defines):
-                    dt = datetime.fromisoformat(t_str)
-                    target_date = dt.strftime('%Y-%m-%d')
-                    
-                    w_code = area['weatherCodes'][i]
-                    w_text = get_weather_text_by_code(w_code)
-                    
-                    pop_val = area['pops'][i] if 'pops' in area and area['pops'][i] else ""
-                    pops_str = f"一日:{pop_val}%" if pop_val else ""
-                    
-                    temps_list = []
-                    if temp_area:
-                        # 週間予報の気温(Min/Max)
-                        try:
-                            min_t = temp_area['tempsMin'][i]
-                            max_t = temp_area['tempsMax'][i]
-                            if min_t and min_t.strip(): temps_list.append(min_t)
-                            if max_t and max_t.strip(): temps_list.append(max_t)
-                        except IndexError:
-                            pass # データ不足時はスキップ
-                    
-                    temps_str = ",".join(temps_list)
-
-                    cur.execute("""
-                        INSERT OR REPLACE INTO forecasts 
-                        (area_code, parent_code, area_name, target_date, 
-                         weather_code, weather_text, wind_text, wave_text, 
-                         temps, pops, report_datetime, data_source)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'weekly')
-                    """, (
-                        a_code, parent_code, a_name, target_date,
-                        w_code, w_text, "", "",
-                        temps_str, pops_str, report_datetime
-                    ))
-            conn.commit()
-        except Exception as e:
-            print(f"⚠️ 週間予報処理エラー: {e}")
-        finally:
-            conn.close()
-
-    def _sync_short_forecast(self, data, parent_code):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        try:
-            report_datetime = data['reportDatetime']
-            ts_weather = data['timeSeries'][0]
-            time_defines_weather = ts_weather['timeDefines']
-            
-            ts_temps = data['timeSeries'][2] if len(data['timeSeries']) > 2 else None
-            time_defines_temps = ts_temps['timeDefines'] if ts_temps else []
-
-            ts_pops = data['timeSeries'][1] if len(data['timeSeries']) > 1 else None
-            time_defines_pops = ts_pops['timeDefines'] if ts_pops else []
-
-            for area_idx, area_data in enumerate(ts_weather['areas']):
-                a_code = area_data['area']['code']
-                a_name = area_data['area']['name']
-                
-                for time_idx, t_str in enumerate(time_defines_weather):
-                    dt = datetime.fromisoformat(t_str)
-                    target_date = dt.strftime('%Y-%m-%d')
-                    
-                    w_code = area_data['weatherCodes'][time_idx]
-                    w_text = area_data['weathers'][time_idx]
-                    wind_text = area_data['winds'][time_idx]
-                    wave_text = area_data['waves'][time_idx] if 'waves' in area_data and time_idx < len(area_data['waves']) else ""
-
-                    # 気温
-                    temps_list = []
-                    if ts_temps and area_idx < len(ts_temps['areas']):
-                        temp_area = ts_temps['areas'][area_idx]
-                        for t_idx, t_time in enumerate(time_defines_temps):
-                            if t_time.startswith(target_date):
-                                val = temp_area['temps'][t_idx]
-                                if val and val.strip(): temps_list.append(val)
-
-                    # 降水確率
-                    pops_list = []
-                    if ts_pops and area_idx < len(ts_pops['areas']):
-                        pop_area = ts_pops['areas'][area_idx]
-                        for p_idx, p_time in enumerate(time_defines_pops):
-                            if p_time.startswith(target_date):
-                                val = pop_area['pops'][p_idx]
-                                hh = datetime.fromisoformat(p_time).strftime("%H")
-                                if val and val.strip(): pops_list.append(f"{hh}時:{val}%")
-
-                    temps_str = ",".join(temps_list)
-                    pops_str = ",".join(pops_list)
-                    
-                    cur.execute("""
-                        INSERT OR REPLACE INTO forecasts 
-                        (area_code, parent_code, area_name, target_date, 
-                         weather_code, weather_text, wind_text, wave_text, 
-                         temps, pops, report_datetime, data_source)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'short')
-                    """, (
-                        a_code, parent_code, a_name, target_date,
-                        w_code, w_text, wind_text, wave_text,
-                        temps_str, pops_str, report_datetime
-                    ))
-            conn.commit()
-        except Exception as e:
-            print(f"❌ 短期予報処理エラー: {e}")
-        finally:
-            conn.close()
-
-    def get_available_dates(self, parent_code):
-        conn = self.get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT DISTINCT target_date FROM forecasts WHERE parent_code = ? ORDER BY target_date", (parent_code,))
-        dates = [row[0] for row in cur.fetchall()]
-        conn.close()
-        return dates
-
-    def get_forecasts_by_date(self, parent_code, target_date):
-        conn = self.get_conn()
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        # まず対象の日付の全データを取得
-        cur.execute("SELECT * FROM forecasts WHERE parent_code = ? AND target_date = ?", (parent_code, target_date))
-        rows = cur.fetchall()
-        conn.close()
-        
-        # --- 重複排除ロジック (Python側で処理) ---
-        # 同じエリア名(area_name)で、data_sourceが異なる場合、'short'を優先する
-        unique_data = {}
-        
-        for row in rows:
-            name = row['area_name']
-            source = row['data_source']
-            
-            if name not in unique_data:
-                # まだ登録されていなければ追加
-                unique_data[name] = row
-            else:
-                # 既に登録済みの場合、現在持っているのがweeklyで、新しいのがshortなら上書き
-                existing_source = unique_data[name]['data_source']
-                if existing_source == 'weekly' and source == 'short':
-                    unique_data[name] = row
-                # それ以外（既にshortがある、または同等）なら何もしない
-
-        return list(unique_data.values())
+# セッションごとに保持するカードの最大数 (日付を行き来しても作り直さない)
+CARD_CACHE_SIZE = 128
+# 地名検索で一覧に出す候補の数
+SEARCH_LIMIT = 20
+# 計測結果の保存先 (拡張子 .json / .csv を付ける)。WEATHER_TRACE=1 で計測とデバッグパネルが有効になる
+TRACE_EXPORT_BASE = "weather_trace"
+HTTP_CACHE = HttpCache()
+# 発表の鮮度 (publication.staleness の状態) ごとの表示色
+STALENESS_COLORS = {"fresh": ft.Colors.GREEN_700, "stale": ft.Colors.ORANGE_700, "old": ft.Colors.RED_700}
 
 # --- UIヘルパー ---
 def get_weather_icon(weather_text, weather_code):
@@ -256,10 +41,39 @@ def get_weather_icon(weather_text, weather_code):
     
     return (ft.Icons.QUESTION_MARK, ft.Colors.GREY)
 
-try:
-    AREA_JSON = requests.get(AREA_URL).json()
-except:
-    AREA_JSON = None
+class CardCache:
+    """作成済みのカード (Flet コントロール) を予報の内容ごとに保持する LRU キャッシュ"""
+
+    def __init__(self, maxsize=CARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cards = OrderedDict()
+
+    @staticmethod
+    def key(row):
+        # 同じ発表の同じ行なら内容は変わらない (週間と短期で地域コードが重なるので種類も含める)
+        return (row['area_code'], row['target_date'], row['report_datetime'], row['data_source'])
+
+    def get_or_create(self, row, factory):
+        key = self.key(row)
+        card = self._cards.get(key)
+        if card is None:
+            card = factory(row)
+            self._cards[key] = card
+            if len(self._cards) > self.maxsize:
+                self._cards.popitem(last=False)
+        else:
+            self._cards.move_to_end(key)
+        return card
+
+# 地域データはローカルのスナップショットから読み、最新版は画面表示後に取得する
+AREA_STORE = AreaStore(HTTP_CACHE)
+AREA_STORE.load_snapshot()
+
+# DB・読み込み結果・取得は全セッションで共有する (Web で複数人が開いても接続と取得は1つ)
+SERVICE = ForecastService(DB_NAME, HTTP_CACHE)
+
+# 発表時刻に合わせて古いオフィスを裏で取り直す (プロセスに1つ)
+SCHEDULER = SyncScheduler(SERVICE)
 
 # --- メインアプリ ---
 def main(page: ft.Page):
@@ -268,50 +82,45 @@ def main(page: ft.Page):
     page.padding = 20
     page.scroll = "adaptive"
 
-    if not AREA_JSON:
-        page.add(ft.Text("ネットワークエラー: 地域情報を取得できません"))
-        return
-
-    db = WeatherDatabase(DB_NAME)
-
-    center_dd = ft.Dropdown(label="地方", width=200, options=[ft.dropdown.Option(k, v["name"]) for k, v in AREA_JSON["centers"].items()])
-    office_dd = ft.Dropdown(label="都道府県", width=200, disabled=True)
+    place_search = ft.SearchBar(bar_hint_text="地名・よみで検索 (例: 札幌 / さっぽろ)", view_hint_text="地名・よみを入力",
+                                width=420, disabled=True, controls=[])
+    # 選択中の府県予報区。コードは data に持つ
+    office_txt = ft.Text("", weight="bold", data=None)
     date_dd = ft.Dropdown(label="日付を選択", width=300, disabled=True, icon=ft.Icons.CALENDAR_MONTH)
     result_col = ft.Column(spacing=20)
+    card_cache = CardCache()
     status_txt = ft.Text("地域を選択してください", color="grey")
+    # 表示中の予報の発表時刻と鮮度。data には最後の取得エラー (オフラインなど) を持つ
+    freshness_txt = ft.Text("", size=12, text_align="right", data=None)
 
     def create_detail_card(row):
         w_text = row['weather_text']
         w_code = row['weather_code']
         wind = row['wind_text']
         wave = row['wave_text']
-        temps_str_list = row['temps'].split(',') if row['temps'] else []
+        # 気温は取り込み時に整数化した min_temp / max_temp を使う
+        min_t, max_t = row['min_temp'], row['max_temp']
         pops_raw = row['pops'].split(',') if row['pops'] else []
 
         icon, color = get_weather_icon(w_text, w_code)
         
         # 気温表示ロジック
         temp_controls = []
-        if temps_str_list:
-            try:
-                temps_int = sorted([int(t) for t in temps_str_list])
-                if len(temps_int) >= 2 and temps_int[0] != temps_int[-1]:
-                    min_t, max_t = temps_int[0], temps_int[-1]
-                    temp_controls.append(ft.Container(
-                        content=ft.Row([
-                            ft.Column([ft.Text("最低", size=10, color="blue"), ft.Text(f"{min_t}℃", size=16, weight="bold", color=ft.Colors.BLUE_700)], spacing=0, horizontal_alignment="center"),
-                            ft.Text("/", size=20, color="grey"),
-                            ft.Column([ft.Text("最高", size=10, color="red"), ft.Text(f"{max_t}℃", size=16, weight="bold", color=ft.Colors.RED_700)], spacing=0, horizontal_alignment="center"),
-                        ], alignment="center", spacing=15),
-                        bgcolor=ft.Colors.WHITE, padding=10, border_radius=8
-                    ))
-                else:
-                    val = temps_int[0] if temps_int else "-"
-                    temp_controls.append(ft.Container(
-                        content=ft.Row([ft.Icon(ft.Icons.THERMOSTAT, size=16, color="orange"), ft.Text("予想気温:", size=12, color="grey"), ft.Text(f"{val}℃", size=16, weight="bold", color=ft.Colors.ORANGE_800)], alignment="center"),
-                        bgcolor=ft.Colors.WHITE, padding=10, border_radius=8
-                    ))
-            except ValueError: pass
+        if min_t is not None:
+            if max_t != min_t:
+                temp_controls.append(ft.Container(
+                    content=ft.Row([
+                        ft.Column([ft.Text("最低", size=10, color="blue"), ft.Text(f"{min_t}℃", size=16, weight="bold", color=ft.Colors.BLUE_700)], spacing=0, horizontal_alignment="center"),
+                        ft.Text("/", size=20, color="grey"),
+                        ft.Column([ft.Text("最高", size=10, color="red"), ft.Text(f"{max_t}℃", size=16, weight="bold", color=ft.Colors.RED_700)], spacing=0, horizontal_alignment="center"),
+                    ], alignment="center", spacing=15),
+                    bgcolor=ft.Colors.WHITE, padding=10, border_radius=8
+                ))
+            else:
+                temp_controls.append(ft.Container(
+                    content=ft.Row([ft.Icon(ft.Icons.THERMOSTAT, size=16, color="orange"), ft.Text("予想気温:", size=12, color="grey"), ft.Text(f"{min_t}℃", size=16, weight="bold", color=ft.Colors.ORANGE_800)], alignment="center"),
+                    bgcolor=ft.Colors.WHITE, padding=10, border_radius=8
+                ))
 
         # 降水確率
         pop_controls = []
@@ -338,12 +147,14 @@ def main(page: ft.Page):
             bgcolor=color, border_radius=15, padding=20, width=320, shadow=ft.BoxShadow(blur_radius=10, color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK))
         )
 
-    def show_forecasts(target_date):
-        # 修正されたデータ取得メソッドを使用
-        rows = db.get_forecasts_by_date(office_dd.value, target_date)
+    def show_forecasts(target_date, rows=None):
+        # rows を渡されなければDBから読む (async ハンドラは別スレッドで読んでから渡す)
+        if rows is None:
+            rows = SERVICE.get_forecasts_by_date(office_txt.data, target_date)
         result_col.controls.clear()
         
         if not rows:
+            result_col.data = None
             result_col.controls.append(ft.Text("データが見つかりません"))
             page.update()
             return
@@ -354,57 +165,271 @@ def main(page: ft.Page):
         # タイトルの作成
         result_col.controls.append(ft.Text(f"📅 {date_str} の天気", size=20, weight="bold"))
         
-        cards = [create_detail_card(row) for row in rows]
+        with tracing.span("render.cards"):
+            cards = [card_cache.get_or_create(row, create_detail_card) for row in rows]
         result_col.controls.append(ft.Row(cards, wrap=True, alignment="center"))
         
-        last = rows[0]['report_datetime']
-        last_dt = datetime.fromisoformat(last).strftime("%Y/%m/%d %H:%M")
-        result_col.controls.append(ft.Text(f"更新: {last_dt}", size=12, color="grey", text_align="right"))
-        page.update()
+        result_col.data = (target_date, max(row['report_datetime'] for row in rows))
+        update_freshness()
+        result_col.controls.append(freshness_txt)
+        with tracing.span("render.update"):
+            page.update()
+        refresh_debug_panel()
 
-    def on_office_change(e):
-        if not office_dd.value: return
-        status_txt.value = "データを取得・更新中..."
+    def update_freshness():
+        """表示中の予報 (result_col.data = (日付, 発表時刻)) の鮮度を表示する。ネットワークは待たない"""
+        if result_col.data is None:
+            # 予報を表示していない
+            return
+        target_date, report_datetime = result_col.data
+        if target_date < datetime.now(JST).strftime('%Y-%m-%d'):
+            # 過去の日付はもう発表されないので鮮度は出さない
+            freshness_txt.value = f"更新: {datetime.fromisoformat(report_datetime).strftime('%Y/%m/%d %H:%M')} 発表"
+            freshness_txt.color = "grey"
+            return
+        state, label = staleness(report_datetime)
+        if freshness_txt.data is not None:
+            label += " ・📴 オフライン: 保存済みの予報を表示中"
+        elif state != "fresh":
+            label += " ・🔄 最新の発表を確認中"
+        freshness_txt.value = f"更新: {label}"
+        freshness_txt.color = STALENESS_COLORS[state]
+
+    def pick_date(dates, keep_date=None):
+        if keep_date in dates:
+            return keep_date
+        # 履歴が残っているので、今日以降の最初の日付を初期表示にする
+        today = datetime.now(JST).strftime('%Y-%m-%d')
+        return next((d for d in dates if d >= today), dates[-1])
+
+    def set_date_options(dates, first):
+        date_dd.options = [ft.dropdown.Option(d) for d in dates]
+        date_dd.value = first
+        date_dd.disabled = False
+        status_txt.value = "日付を選択してください"
+
+    def load_dates(office_code, keep_date=None):
+        """DBに保存済みの日付で日付ドロップダウンを作り、予報を表示する。データがなければ False"""
+        dates = SERVICE.get_available_dates(office_code)
+        if not dates:
+            return False
+        first = pick_date(dates, keep_date)
+        set_date_options(dates, first)
+        show_forecasts(first)
+        return True
+
+    # 都道府県・日付の読み込みは最後に選ばれたものだけを表示する
+    latest_load = LatestOnly()
+
+    def read_office(office_code):
+        """(直近の発表を取り込み済みか, 日付一覧, 最初に表示する日付, その日の予報) をDBから読む"""
+        fresh = SERVICE.has_fresh_data(office_code)
+        dates = SERVICE.get_available_dates(office_code)
+        if not dates:
+            return fresh, dates, None, []
+        first = pick_date(dates)
+        return fresh, dates, first, SERVICE.get_forecasts_by_date(office_code, first)
+
+    async def show_office(office_node):
+        office = office_node.code
+        office_txt.value = f"📍 {office_node.name}"
+        office_txt.data = office
+        freshness_txt.data = None
+        latency = EventLatency("都道府県選択", office)
+        # 前の都道府県の読み込みがまだ終わっていなければキャンセルする
+        latest_load.claim()
         date_dd.disabled = True
         result_col.controls.clear()
+        result_col.data = None
+        status_txt.value = "読み込み中..."
         page.update()
+        latency.mark("初回描画")
 
         try:
-            res = requests.get(FORECAST_URL.format(office_dd.value))
-            res.raise_for_status()
-            db.sync_all_data(res.json(), office_dd.value)
-            
-            dates = db.get_available_dates(office_dd.value)
+            # DBの読み込みは別スレッドで行い、その間も他の操作を受け付ける
+            fresh, dates, first, rows = await latest_load.run(read_office, office)
+            # 表示は常にDBから (通信を待たない)。古ければスケジューラが裏で取り直し、届いたら差し替える
+            if not fresh:
+                SCHEDULER.request(office)
             if dates:
-                date_dd.options = [ft.dropdown.Option(d) for d in dates]
-                date_dd.value = dates[0]
-                date_dd.disabled = False
-                status_txt.value = "日付を選択してください"
-                show_forecasts(dates[0])
+                set_date_options(dates, first)
+                show_forecasts(first, rows)
             else:
-                status_txt.value = "データなし"
+                status_txt.value = "データを取得・更新中..."
+        except asyncio.CancelledError:
+            # 別の都道府県が選ばれた。画面はそちらのハンドラが更新する
+            latency.cancelled()
+            return
         except Exception as ex:
             status_txt.value = f"エラー: {ex}"
             print(ex)
         page.update()
+        latency.done()
+        tracing.record("ui.office_change", latency.marks[-1][1])
 
-    def on_center_change(e):
-        children = AREA_JSON["centers"].get(center_dd.value, {}).get("children", [])
-        office_dd.options = [ft.dropdown.Option(c, AREA_JSON["offices"][c]["name"]) for c in children if c in AREA_JSON["offices"]]
-        office_dd.value = None
-        office_dd.disabled = False
+    async def on_date_change(e):
+        office, target_date = office_txt.data, date_dd.value
+        latency = EventLatency("日付選択", target_date)
+        latest_load.claim()
+        try:
+            rows = await latest_load.run(SERVICE.get_forecasts_by_date, office, target_date)
+        except asyncio.CancelledError:
+            latency.cancelled()
+            return
+        show_forecasts(target_date, rows)
+        latency.done()
+        tracing.record("ui.date_change", latency.marks[-1][1])
+
+    def on_forecasts_updated(changed, failed):
+        # スケジューラのスレッドから呼ばれる
+        office = office_txt.data
+        if office in changed:
+            freshness_txt.data = None
+            load_dates(office, keep_date=date_dd.value)
+            page.update()
+        elif office in failed and date_dd.disabled:
+            status_txt.value = f"エラー: {failed[office]}"
+            page.update()
+        elif office in failed:
+            # 保存済みの予報は表示したまま、取得できなかったことだけ知らせる (スケジューラが再試行する)
+            freshness_txt.data = failed[office]
+            update_freshness()
+            page.update()
+
+    # --- 地名検索 ---
+    def search_result_tile(node):
+        office = AREA_STORE.data.office_of(node)
+        where = LEVEL_LABELS[node.level_name]
+        if office is not None and office != node:
+            where = f"{office.name} の{where}"
+
+        async def on_click(e):
+            if office is None:
+                # 地方を選んだら、その中の府県予報区を候補に出す
+                place_search.controls = [search_result_tile(child) for child in node.children]
+                place_search.update()
+                return
+            place_search.close_view(node.name)
+            await show_office(office)
+
+        return ft.ListTile(title=ft.Text(node.name), subtitle=ft.Text(where, size=12, color="grey"), on_click=on_click)
+
+    def on_search_change(e):
+        if not AREA_STORE.data: return
+        nodes = AREA_STORE.data.search(e.data, limit=SEARCH_LIMIT) if e.data else AREA_STORE.data.centers()
+        place_search.controls = [search_result_tile(n) for n in nodes] or [ft.ListTile(title=ft.Text("見つかりません", color="grey"))]
+        place_search.update()
+
+    async def on_search_submit(e):
+        # Enter では一番上の候補を選ぶ
+        nodes = AREA_STORE.data.search(e.data, limit=1) if AREA_STORE.data else []
+        office = AREA_STORE.data.office_of(nodes[0]) if nodes else None
+        if office is None:
+            return
+        place_search.close_view(nodes[0].name)
+        await show_office(office)
+
+    def on_sync_all(e):
+        if not AREA_STORE.data: return
+        # 全オフィスの一括取得はUIスレッドを止めないよう別スレッドで実行する
+        sync_btn.disabled = True
+        status_txt.value = "全国の予報を一括取得中..."
         page.update()
 
-    center_dd.on_change = on_center_change
-    office_dd.on_change = on_office_change
-    date_dd.on_change = lambda e: show_forecasts(date_dd.value)
+        def on_progress(done, total, code, error):
+            status_txt.value = f"全国の予報を一括取得中... {done}/{total}"
+            page.update()
+
+        def run():
+            _, failed = SERVICE.prefetch_all([n.code for n in AREA_STORE.data.offices()], on_progress=on_progress)
+            status_txt.value = f"一括取得完了 (失敗 {len(failed)} 件)" if failed else "一括取得完了"
+            sync_btn.disabled = False
+            if office_txt.data and date_dd.value:
+                show_forecasts(date_dd.value)
+            page.update()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    sync_btn = ft.ElevatedButton("全国一括取得", icon=ft.Icons.CLOUD_DOWNLOAD, on_click=on_sync_all)
+
+    # --- デバッグパネル (計測が有効なときだけ表示) ---
+    debug_rows = ft.Column(spacing=2)
+    debug_counters = ft.Text("", size=11, color="grey", selectable=True)
+
+    def refresh_debug_panel(update=False):
+        if not tracing.is_enabled():
+            return
+        stats, counters = tracing.summary()
+        debug_rows.controls = [
+            ft.Text(f"{name:<22} {st['count']:>6}回  直近 {st['last_ms']:8.2f}ms  平均 {st['avg_ms']:8.2f}ms  最大 {st['max_ms']:8.2f}ms",
+                    size=11, font_family="monospace")
+            for name, st in stats.items()
+        ] or [ft.Text("まだ計測結果がありません", size=11, color="grey")]
+        debug_counters.value = "  ".join(f"{k}={v}" for k, v in counters.items())
+        if update:
+            page.update()
+
+    def on_export_trace(e):
+        json_path = tracing.export_json(TRACE_EXPORT_BASE + ".json")
+        csv_path = tracing.export_csv(TRACE_EXPORT_BASE + ".csv")
+        status_txt.value = f"計測結果を保存しました: {json_path}, {csv_path}"
+        page.update()
+
+    debug_panel = ft.ExpansionTile(
+        title=ft.Text("🐞 計測 (WEATHER_TRACE)", size=14),
+        visible=tracing.is_enabled(),
+        controls=[
+            debug_rows,
+            debug_counters,
+            ft.Row([
+                ft.TextButton("更新", icon=ft.Icons.REFRESH, on_click=lambda e: refresh_debug_panel(update=True)),
+                ft.TextButton("JSON / CSV に保存", icon=ft.Icons.SAVE_ALT, on_click=on_export_trace),
+            ]),
+        ],
+    )
+    refresh_debug_panel()
+
+    def set_area_options(area_index):
+        place_search.controls = [search_result_tile(n) for n in area_index.centers()]
+        place_search.disabled = False
+
+    def on_area_update(area_index):
+        # バックグラウンドで最新の地域データが届いたら候補を差し替える
+        if area_index is None:
+            status_txt.value = "ネットワークエラー: 地域情報を取得できません"
+        else:
+            set_area_options(area_index)
+            if not office_txt.data:
+                status_txt.value = "地域を選択してください"
+        page.update()
+
+    if AREA_STORE.data:
+        set_area_options(AREA_STORE.data)
+    else:
+        # スナップショットがない初回起動時は、取得できるまで検索を無効にしておく
+        status_txt.value = "地域情報を取得中..."
+    AREA_STORE.add_listener(on_area_update)
+    SCHEDULER.add_listener(on_forecasts_updated)
+
+    def on_disconnect(e):
+        AREA_STORE.remove_listener(on_area_update)
+        SCHEDULER.remove_listener(on_forecasts_updated)
+
+    page.on_disconnect = on_disconnect
+
+    place_search.on_change = on_search_change
+    place_search.on_submit = on_search_submit
+    date_dd.on_change = on_date_change
 
     page.add(
         ft.Text("🌤️ 週間天気DBアプリ", size=28, weight="bold"),
-        ft.Container(content=ft.Column([ft.Row([center_dd, office_dd]), ft.Row([ft.Icon(ft.Icons.HISTORY), date_dd]), status_txt]), padding=15, bgcolor=ft.Colors.BLUE_50, border_radius=10),
+        ft.Container(content=ft.Column([ft.Row([place_search, sync_btn]), office_txt, ft.Row([ft.Icon(ft.Icons.HISTORY), date_dd]), status_txt]), padding=15, bgcolor=ft.Colors.BLUE_50, border_radius=10),
+        debug_panel,
         ft.Divider(),
         result_col
     )
+    AREA_STORE.refresh_async()
+    SCHEDULER.start()
 
 if __name__ == "__main__":
     ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,126 @@
+import threading
+import time
+from datetime import datetime
+
+from publication import JST, is_report_fresh, next_publication_time
+from jma_client import PREFETCH_WORKERS
+
+# --- バックグラウンド同期 ---
+# 気象庁の発表時刻 (05/11/17時) に合わせて、DBに保存済みのオフィスのうち
+# 古くなったものだけを取り直す。UIはDBから読むだけなので通信の遅さに引きずられない。
+
+# 発表直後はまだファイルが更新されていないことがあるので少し待ってから確認する
+PUBLISH_DELAY = 60
+# 古いオフィスが残っている間 (発表の遅れ・通信エラー) の再確認間隔 (秒)
+RETRY_INTERVAL = 300
+# DBの圧縮 (古い発表の整理・アーカイブの訂正前スナップショットの削除) の間隔 (秒)
+COMPACT_INTERVAL = 24 * 60 * 60
+
+class SyncScheduler:
+    def __init__(self, service, max_workers=PREFETCH_WORKERS, compact_interval=COMPACT_INTERVAL):
+        # 取得・DBはセッションと同じ ForecastService を使う (同じオフィスの取得が重ならない)
+        self.service = service
+        self.max_workers = max_workers
+        self._pending = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.compact_interval = compact_interval
+        self._last_compact = None
+
+    def start(self):
+        """スケジューラのスレッドを起動する (起動済みなら何もしない)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="sync-scheduler")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def add_listener(self, callback):
+        """同期のたびに callback(更新されたオフィスコードの集合, {失敗したコード: 例外}) を呼ぶ"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def request(self, office_code):
+        """オフィスの同期を依頼する (DBにまだない・古い場合だけ取得される)"""
+        with self._lock:
+            self._pending.add(office_code)
+        self._wake.set()
+
+    def stale_offices(self, now=None):
+        """追跡中 (DBに保存済み + 依頼済み) のオフィスのうち、直近の発表を取り込んでいないもの"""
+        reports = self.service.db.get_latest_report_datetimes()
+        with self._lock:
+            codes = set(reports) | self._pending
+            self._pending.clear()
+        return sorted(c for c in codes if not is_report_fresh(reports.get(c), now))
+
+    def run_once(self, now=None):
+        """古いオフィスを1回同期して、まだ古いまま残ったオフィスの一覧を返す"""
+        stale = self.stale_offices(now)
+        if not stale:
+            return []
+
+        db = self.service.db
+        before = db.get_latest_report_datetimes()
+        _, failed = self.service.prefetch_all(stale, max_workers=self.max_workers)
+        after = db.get_latest_report_datetimes()
+
+        changed = {c for c in stale if after.get(c) != before.get(c)}
+        if changed or failed:
+            self._notify(changed, failed)
+        return [c for c in stale if not is_report_fresh(after.get(c), now)]
+
+    def compact_if_due(self, now=None):
+        """前回の圧縮から compact_interval 秒以上たっていれば圧縮する (圧縮したら True)"""
+        now_mono = time.monotonic()
+        if self._last_compact is not None and now_mono - self._last_compact < self.compact_interval:
+            return False
+        self._last_compact = now_mono
+        self.service.compact(now)
+        return True
+
+    def _notify(self, changed, failed):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(changed, failed)
+            except Exception as e:
+                print(f"⚠️ 更新通知に失敗: {e}")
+
+    def _seconds_until_next_check(self, still_stale):
+        if still_stale:
+            return RETRY_INTERVAL
+        now = datetime.now(JST)
+        return (next_publication_time(now) - now).total_seconds() + PUBLISH_DELAY
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                still_stale = self.run_once()
+            except Exception as e:
+                print(f"⚠️ バックグラウンド同期エラー: {e}")
+                still_stale = True
+            # 同期が終わった後の空き時間に圧縮する (起動直後に1回、以降は compact_interval ごと)
+            try:
+                self.compact_if_due()
+            except Exception as e:
+                print(f"⚠️ DB圧縮エラー: {e}")
+            wait = self._seconds_until_next_check(still_stale)
+            print(f"🕒 次の同期確認まで {wait / 60:.0f}分")
+            # request() が呼ばれたら待たずに次の同期に進む
+            self._wake.wait(wait)
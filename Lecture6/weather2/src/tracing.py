@@ -0,0 +1,132 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# --- 計測 (スパン・カウンター) ---
+# 取得 → 解析 → 保存 → 表示 の各段階に名前付きのスパンを付けて所要時間を記録する。
+#   with tracing.span("db.select"): ...
+#   tracing.count("http.304")
+# 無効のときの span() は何もしない共通のオブジェクトを返すだけなので、ほぼコストがかからない。
+# 環境変数 WEATHER_TRACE=1 か enable() で有効になる。
+
+# 直近のスパンをいくつ残すか (エクスポートとデバッグパネル用)
+TRACE_HISTORY_SIZE = 2000
+TRACE_ENV = "WEATHER_TRACE"
+
+_enabled = os.environ.get(TRACE_ENV, "") not in ("", "0")
+_lock = threading.Lock()
+_spans = deque(maxlen=TRACE_HISTORY_SIZE)
+_stats = {}
+_counters = {}
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        record(self.name, (time.perf_counter() - self.start) * 1000, error=exc_type is not None)
+        return False
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+def is_enabled():
+    return _enabled
+
+def span(name):
+    """name の所要時間を計測するコンテキストマネージャ (無効なら何もしない)"""
+    return _Span(name) if _enabled else _NOOP
+
+def traced(name):
+    """関数全体を span(name) で囲むデコレーター"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record(name, ms, error=False):
+    """計測済みの所要時間を追加する (スパンの外で測ったもの用)"""
+    if not _enabled:
+        return
+    with _lock:
+        _spans.append((time.time(), name, ms, threading.current_thread().name, error))
+        stat = _stats.get(name)
+        if stat is None:
+            # [回数, 合計ms, 最大ms, 直近ms]
+            stat = _stats[name] = [0, 0.0, 0.0, 0.0]
+        stat[0] += 1
+        stat[1] += ms
+        stat[2] = max(stat[2], ms)
+        stat[3] = ms
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _stats.clear()
+        _counters.clear()
+
+def summary():
+    """{スパン名: {count, total_ms, avg_ms, max_ms, last_ms}} と {カウンター名: 値}"""
+    with _lock:
+        stats = {
+            name: {"count": n, "total_ms": total, "avg_ms": total / n, "max_ms": peak, "last_ms": last}
+            for name, (n, total, peak, last) in sorted(_stats.items())
+        }
+        return stats, dict(sorted(_counters.items()))
+
+def recent(limit=None):
+    """直近のスパン [(時刻, 名前, ms, スレッド名, 例外で終わったか)] (新しい順)"""
+    with _lock:
+        spans = list(_spans)
+    spans.reverse()
+    return spans[:limit] if limit else spans
+
+def export_json(path):
+    stats, counters = summary()
+    data = {
+        "summary": stats,
+        "counters": counters,
+        "spans": [{"time": t, "name": n, "ms": ms, "thread": th, "error": err} for t, n, ms, th, err in reversed(recent())],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    return path
+
+def export_csv(path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "name", "ms", "thread", "error"])
+        for t, name, ms, thread, error in reversed(recent()):
+            writer.writerow([f"{t:.6f}", name, f"{ms:.3f}", thread, int(error)])
+    return path